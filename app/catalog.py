@@ -0,0 +1,154 @@
+"""
+Columnar catalog and cart for large catalogs and carts with many lines.
+"""
+
+import operator
+from array import array
+from decimal import Decimal
+from typing import Dict, Iterator, Tuple
+
+from app.eshop import Product, to_money
+from app.inventory import InventoryStore
+
+MINOR_UNITS = 100
+
+
+class ColumnarCatalog:
+    """Catalog keeping prices in a typed array indexed by SKU.
+
+    A SKU is the product's slot in the inventory store, so prices and stock of
+    the same product sit at the same index of two arrays. Prices are stored in
+    integer minor units (cents); prices with a fraction of a cent are rejected
+    rather than rounded, so a ColumnarCart total always equals the total of a
+    ShoppingCart holding the same products.
+    """
+
+    def __init__(self, inventory: InventoryStore = None):
+        """Initialize an empty catalog backed by the given inventory."""
+        self.inventory = inventory or InventoryStore()
+        self.prices = array("q")
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.inventory and self.inventory.slot(name) < len(self.prices)
+
+    def add_product(self, name: str, price: float, available_amount: int) -> Product:
+        """Register a product and return a Product bound to the catalog's inventory.
+
+        Raises ValueError if the price does not fit in whole minor units.
+        """
+        minor_units = to_money(price) * MINOR_UNITS
+        if minor_units != minor_units.to_integral_value():
+            raise ValueError(f"Price {price} of {name} is not a whole number of cents")
+        product = Product(name, price, available_amount, inventory=self.inventory)
+        sku = self.inventory.slot(name)
+        if len(self.prices) <= sku:
+            self.prices.extend([0] * (sku + 1 - len(self.prices)))
+        self.prices[sku] = int(minor_units)
+        return product
+
+    def sku(self, name: str) -> int:
+        """Return the SKU index of a product."""
+        sku = self.inventory.slot(name)
+        if sku >= len(self.prices):
+            raise ValueError(f"Product {name} is not in the catalog")
+        return sku
+
+    def product(self, name: str) -> Product:
+        """Return a Product view of a catalog entry."""
+        sku = self.sku(name)
+        return Product(name, Decimal(self.prices[sku]) / MINOR_UNITS, 0, inventory=self.inventory)
+
+
+class ColumnarCart:
+    """ShoppingCart-compatible cart that stores its lines as parallel typed arrays.
+
+    Each line keeps the SKU, the price at the time it was added and the amount;
+    totals and availability checks run over the arrays with C-level iteration
+    instead of per-line Python objects.
+    """
+
+    def __init__(self, catalog: ColumnarCatalog):
+        """Initialize an empty cart for the given catalog."""
+        self.catalog = catalog
+        self._skus = array("q")
+        self._prices = array("q")
+        self._quantities = array("q")
+        self._lines: Dict[int, int] = {}
+        self._total = 0
+
+    def __len__(self) -> int:
+        return len(self._skus)
+
+    @property
+    def products(self) -> Dict[Product, int]:
+        """Return the cart lines as a {Product: amount} dict, like ShoppingCart.products."""
+        return {self.catalog.product(name): amount for name, amount in self.items()}
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        """Iterate over (product name, amount) pairs."""
+        return zip(map(self.catalog.inventory.name, self._skus), self._quantities)
+
+    def contains_product(self, product: Product) -> bool:
+        """Check if the product is in the cart."""
+        return product.name in self.catalog and self.catalog.sku(product.name) in self._lines
+
+    @property
+    def total_decimal(self) -> Decimal:
+        """Return the exact total price of products in the cart, kept up to date in O(1)."""
+        return Decimal(self._total) / MINOR_UNITS
+
+    def calculate_total(self) -> float:
+        """Calculate the total price of products in the cart."""
+        return float(self.total_decimal)
+
+    def recalculate_total(self) -> float:
+        """Recompute the total from the line arrays."""
+        self._total = sum(map(operator.mul, self._prices, self._quantities))
+        return self.calculate_total()
+
+    def is_available(self) -> bool:
+        """Check that every line of the cart is in stock."""
+        stock = self.catalog.inventory.available_at(self._skus)
+        return all(map(operator.ge, stock, self._quantities))
+
+    def add_product(self, product: Product, amount: int) -> None:
+        """Add a product to the cart with specified amount."""
+        sku = self.catalog.sku(product.name)
+        available = self.catalog.inventory.available_at((sku,))[0]
+        if available < amount:
+            raise ValueError(f"Product {product} has only {available} items")
+        line = self._lines.get(sku)
+        if line is None:
+            self._lines[sku] = len(self._skus)
+            self._skus.append(sku)
+            self._prices.append(self.catalog.prices[sku])
+            self._quantities.append(amount)
+            self._total += self.catalog.prices[sku] * amount
+        else:
+            self._total += self._prices[line] * (amount - self._quantities[line])
+            self._quantities[line] = amount
+
+    def remove_product(self, product: Product) -> None:
+        """Remove a product from the cart."""
+        if product.name not in self.catalog:
+            return
+        line = self._lines.pop(self.catalog.sku(product.name), None)
+        if line is None:
+            return
+        # Переносимо останній рядок на місце видаленого, щоб не зсувати масиви
+        self._total -= self._prices[line] * self._quantities[line]
+        last_sku, last_price, last_quantity = self._skus.pop(), self._prices.pop(), self._quantities.pop()
+        if line < len(self._skus):
+            self._skus[line], self._prices[line], self._quantities[line] = last_sku, last_price, last_quantity
+            self._lines[last_sku] = line
+
+    def submit_cart_order(self) -> list[str]:
+        """Submit the cart order and clear the cart; stock is taken for all lines or none."""
+        self.catalog.inventory.reserve_slots(dict(zip(self._skus, self._quantities)))
+        product_ids = list(map(self.catalog.inventory.name, self._skus))
+        self._skus = array("q")
+        self._prices = array("q")
+        self._quantities = array("q")
+        self._lines.clear()
+        self._total = 0
+        return product_ids
@@ -2,23 +2,67 @@
 Eshop module containing classes for managing products, shopping cart, orders, and shipments.
 """
 
-from typing import Dict
+from typing import TYPE_CHECKING, Callable, Dict
+import threading
 import uuid
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from services import ShippingService  # Переконайтеся, що модуль services доступний
+from decimal import Decimal
+from app.inventory import InventoryStore
+
+if TYPE_CHECKING:
+    # Лише для анотацій: кошик і товари не повинні тягнути за собою boto3
+    from services import ShippingService
+
+# Захищає залишки товарів, які не прив'язані до InventoryStore
+_STOCK_LOCK = threading.RLock()
+
+# Отримує товар, кількість і суму рядка без знижок/податків, повертає кінцеву суму рядка
+LineAdjuster = Callable[['Product', int, Decimal], Decimal]
+
+
+def to_money(value) -> Decimal:
+    """Convert a price to Decimal; floats are taken by their shortest repr, not binary value."""
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
 
 
 class Product:
     """Class representing a product in the e-shop."""
 
-    def __init__(self, name: str, price: float, available_amount: int):
-        """Initialize a Product instance."""
+    __slots__ = ("name", "price", "inventory", "_available_amount")
+
+    def __init__(self, name: str, price: float, available_amount: int, inventory: InventoryStore = None):
+        """Initialize a Product instance.
+
+        With an inventory the stock is kept in the store; a product that is
+        already registered there keeps the store's amount.
+        """
         if name is None:
             raise ValueError("Product name cannot be None")
         self.name = name
         self.price = price
-        self.available_amount = available_amount
+        self.inventory = inventory
+        if inventory is None:
+            self._available_amount = available_amount
+        elif name not in inventory:
+            inventory.add_product(name, available_amount)
+
+    @property
+    def available_amount(self) -> int:
+        """Return the amount of product in stock."""
+        if self.inventory is None:
+            return self._available_amount
+        return self.inventory.available(self.name)
+
+    @available_amount.setter
+    def available_amount(self, amount: int) -> None:
+        """Set the amount of product in stock."""
+        if self.inventory is None:
+            self._available_amount = amount
+        else:
+            self.inventory.set_available(self.name, amount)
 
     def is_available(self, requested_amount: int) -> bool:
         """Check if the requested amount of product is available."""
@@ -26,9 +70,24 @@ class Product:
 
     def buy(self, requested_amount: int) -> None:
         """Reduce available amount after purchase."""
-        if requested_amount > self.available_amount:
-            raise ValueError("Not enough stock available")
-        self.available_amount -= requested_amount
+        if self.inventory is not None:
+            try:
+                self.inventory.reserve({self.name: requested_amount})
+            except ValueError:
+                raise ValueError("Not enough stock available") from None
+            return
+        with _STOCK_LOCK:
+            if requested_amount > self._available_amount:
+                raise ValueError("Not enough stock available")
+            self._available_amount -= requested_amount
+
+    def restock(self, amount: int) -> None:
+        """Return previously bought items to stock."""
+        if self.inventory is not None:
+            self.inventory.restock({self.name: amount})
+            return
+        with _STOCK_LOCK:
+            self._available_amount += amount
 
     def __eq__(self, other: 'Product') -> bool:
         """Check if two products are equal based on name."""
@@ -50,17 +109,42 @@ class Product:
 class ShoppingCart:
     """Class representing a shopping cart with products and their quantities."""
 
-    def __init__(self):
-        """Initialize an empty shopping cart."""
+    def __init__(self, line_adjuster: LineAdjuster = None):
+        """Initialize an empty shopping cart.
+
+        ``line_adjuster`` may apply per-line discounts or taxes; it is called once
+        whenever a line is added or its amount is replaced.
+        """
         self.products: Dict[Product, int] = {}
+        # Кількості, які вже враховані в _total; розбіжність з products означає запис напряму
+        self._counted: Dict[Product, int] = {}
+        self._line_totals: Dict[Product, Decimal] = {}
+        self._total = Decimal(0)
+        self.line_adjuster = line_adjuster
 
     def contains_product(self, product: Product) -> bool:
         """Check if the product is in the cart."""
         return product in self.products
 
+    @property
+    def total_decimal(self) -> Decimal:
+        """Return the exact total price of products in the cart.
+
+        The total is kept up to date by add_product/remove_product; lines changed
+        directly through ``products`` are recalculated on the next call. Line
+        totals use the product price at the time the line was added.
+        """
+        if self.products != self._counted:
+            for product in [product for product in self._counted if product not in self.products]:
+                self._drop_line(product)
+            for product, amount in self.products.items():
+                if self._counted.get(product) != amount:
+                    self._set_line(product, amount)
+        return self._total
+
     def calculate_total(self) -> float:
         """Calculate the total price of products in the cart."""
-        return sum(p.price * count for p, count in self.products.items())
+        return float(self.total_decimal)
 
     def add_product(self, product: Product, amount: int) -> None:
         """Add a product to the cart with specified amount."""
@@ -68,19 +152,62 @@ class ShoppingCart:
             msg = f"Product {product} has only {product.available_amount} items"
             raise ValueError(msg)
         self.products[product] = amount
+        self._set_line(product, amount)
 
     def remove_product(self, product: Product) -> None:
         """Remove a product from the cart."""
         if product in self.products:
             del self.products[product]
+            self._drop_line(product)
+
+    def _set_line(self, product: Product, amount: int) -> None:
+        line_total = to_money(product.price) * amount
+        if self.line_adjuster is not None:
+            line_total = self.line_adjuster(product, amount, line_total)
+        # Кількість замінюється, а не додається, тому віднімаємо попередню суму рядка
+        self._total += line_total - self._line_totals.get(product, 0)
+        self._line_totals[product] = line_total
+        self._counted[product] = amount
+
+    def _drop_line(self, product: Product) -> None:
+        if product in self._counted:
+            del self._counted[product]
+            self._total -= self._line_totals.pop(product)
 
     def submit_cart_order(self) -> list[str]:
-        """Submit the cart order and clear the cart."""
-        product_ids = []
+        """Submit the cart order and clear the cart.
+
+        Stock is taken for the whole cart or, if any product is short, for none of it.
+        """
+        by_inventory: Dict[int, tuple] = {}
+        standalone = []
         for product, count in self.products.items():
-            product.buy(count)
-            product_ids.append(str(product))
+            if product.inventory is None:
+                standalone.append((product, count))
+            else:
+                by_inventory.setdefault(id(product.inventory), (product.inventory, {}))[1][product.name] = count
+
+        reserved = []
+        try:
+            for inventory, items in by_inventory.values():
+                inventory.reserve(items)
+                reserved.append((inventory, items))
+            with _STOCK_LOCK:
+                for product, count in standalone:
+                    if not product.is_available(count):
+                        raise ValueError(f"Product {product} has only {product.available_amount} items")
+                for product, count in standalone:
+                    product.buy(count)
+        except ValueError:
+            for inventory, items in reserved:
+                inventory.restock(items)
+            raise
+
+        product_ids = [str(product) for product in self.products]
         self.products.clear()
+        self._counted.clear()
+        self._line_totals.clear()
+        self._total = Decimal(0)
         return product_ids
 
 
@@ -89,18 +216,32 @@ class Order:
     """Class representing an order in the e-shop."""
 
     cart: ShoppingCart
-    shipping_service: ShippingService
-    order_id: str = str(uuid.uuid4())
+    shipping_service: 'ShippingService'
+    order_id: str = field(default_factory=lambda: str(uuid.uuid4()))
 
-    def place_order(self, shipping_type: str, due_date: datetime = None) -> str:
-        """Place an order with the specified shipping type and due date."""
+    def place_order(self, shipping_type: str, due_date: datetime = None, idempotency_key: str = None) -> str:
+        """Place an order with the specified shipping type and due date.
+
+        Pass the same ``idempotency_key`` when retrying a checkout to get the
+        original shipping back instead of a duplicate; stock is taken only once.
+        """
         if not due_date:
             due_date = datetime.now(timezone.utc) + timedelta(seconds=3)
+        lines = dict(self.cart.products)
         product_ids = self.cart.submit_cart_order()
         print(due_date)
-        return self.shipping_service.create_shipping(
-            shipping_type, product_ids, self.order_id, due_date
+        if idempotency_key is None:
+            return self.shipping_service.create_shipping(
+                shipping_type, product_ids, self.order_id, due_date
+            )
+        shipping_id, created = self.shipping_service.create_shipping_once(
+            shipping_type, product_ids, self.order_id, due_date, idempotency_key
         )
+        if not created:
+            # Замовлення вже оформлене раніше (або паралельно) - повертаємо списаний товар
+            for product, count in lines.items():
+                product.restock(count)
+        return shipping_id
 
 
 @dataclass
@@ -108,8 +249,21 @@ class Shipment:
     """Class representing a shipment in the e-shop."""
 
     shipping_id: str
-    shipping_service: ShippingService
+    shipping_service: 'ShippingService'
 
     def check_shipping_status(self) -> str:
         """Check the status of the shipment."""
-        return self.shipping_service.check_status(self.shipping_id)
\ No newline at end of file
+        return self.shipping_service.check_status(self.shipping_id)
+
+    @staticmethod
+    def check_shipping_statuses(shipments: list['Shipment']) -> Dict[str, str]:
+        """Check the statuses of many shipments with one batched lookup per service."""
+        by_service: Dict[int, list['Shipment']] = {}
+        for shipment in shipments:
+            by_service.setdefault(id(shipment.shipping_service), []).append(shipment)
+        statuses = {}
+        for group in by_service.values():
+            statuses.update(group[0].shipping_service.check_status_many(
+                [shipment.shipping_id for shipment in group]
+            ))
+        return statuses
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+Inventory module with a thread-safe stock store for the e-shop.
+"""
+
+import threading
+from array import array
+from typing import Dict, Iterable, Mapping
+
+
+class InventoryStore:
+    """Stock levels keyed by product name with all-or-nothing reservations.
+
+    Amounts live in one array of 64-bit integers indexed by a name -> slot dict,
+    so large catalogs stay compact and lookups are O(1). Each slot is guarded by
+    one of ``stripes`` locks; a reservation takes only the stripes of the
+    products it touches, in a fixed order, so checkouts of unrelated products
+    run in parallel and cannot deadlock.
+    """
+
+    def __init__(self, stripes: int = 64):
+        """Initialize an empty store."""
+        if stripes < 1:
+            raise ValueError("Inventory needs at least one lock stripe")
+        self._index: Dict[str, int] = {}
+        self._names: list = []
+        self._amounts = array("q")
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._register_lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def add_product(self, name: str, amount: int) -> None:
+        """Register a product, or increase its stock if it is already known."""
+        with self._register_lock:
+            slot = self._index.get(name)
+            if slot is None:
+                self._amounts.append(0)
+                self._names.append(name)
+                self._index[name] = len(self._amounts) - 1
+        self.restock({name: amount})
+
+    def available(self, name: str) -> int:
+        """Return the current stock of a product."""
+        return self._amounts[self.slot(name)]
+
+    def set_available(self, name: str, amount: int) -> None:
+        """Overwrite the stock of a product."""
+        if amount < 0:
+            raise ValueError("Stock cannot be negative")
+        slot = self.slot(name)
+        with self._stripes[slot % len(self._stripes)]:
+            self._amounts[slot] = amount
+
+    def available_at(self, slots: Iterable[int]) -> list:
+        """Return the stock of many slots at once."""
+        return list(map(self._amounts.__getitem__, slots))
+
+    def reserve(self, items: Mapping[str, int]) -> None:
+        """Take stock for all items at once or, if any of them is short, for none."""
+        self.reserve_slots(self._slots(items))
+
+    def reserve_slots(self, slots: Mapping[int, int]) -> None:
+        """Same as reserve() for items already resolved to slots."""
+        with _StripeGuard(self._stripes, slots):
+            for slot, amount in slots.items():
+                if self._amounts[slot] < amount:
+                    raise ValueError(f"Product {self._names[slot]} has only {self._amounts[slot]} items")
+            for slot, amount in slots.items():
+                self._amounts[slot] -= amount
+
+    def restock(self, items: Mapping[str, int]) -> None:
+        """Return stock, e.g. to undo a reservation."""
+        slots = self._slots(items)
+        with _StripeGuard(self._stripes, slots):
+            for slot, amount in slots.items():
+                self._amounts[slot] += amount
+
+    def slot(self, name: str) -> int:
+        """Return the array slot of a product."""
+        try:
+            return self._index[name]
+        except KeyError:
+            raise ValueError(f"Product {name} is not in the inventory") from None
+
+    def name(self, slot: int) -> str:
+        """Return the product name stored in a slot."""
+        return self._names[slot]
+
+    def _slots(self, items: Mapping[str, int]) -> Dict[int, int]:
+        slots: Dict[int, int] = {}
+        for name, amount in items.items():
+            if amount < 0:
+                raise ValueError("Amount cannot be negative")
+            slot = self.slot(name)
+            slots[slot] = slots.get(slot, 0) + amount
+        return slots
+
+
+class _StripeGuard:
+    """Acquire the lock stripes of a set of slots in ascending order."""
+
+    def __init__(self, stripes: list, slots: Iterable[int]):
+        self._locks = [stripes[i] for i in sorted({slot % len(stripes) for slot in slots})]
+
+    def __enter__(self) -> None:
+        for lock in self._locks:
+            lock.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        for lock in reversed(self._locks):
+            lock.release()
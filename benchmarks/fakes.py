@@ -0,0 +1,52 @@
+"""
+In-process SQS stand-in used by the benchmarks.
+"""
+
+import itertools
+import time
+from collections import deque
+
+
+class FakeSQSClient:
+    """Minimal SQS client keeping messages in a deque."""
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.messages = deque()
+        self._ids = itertools.count()
+
+    def _round_trip(self) -> None:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def get_queue_url(self, QueueName):  # pylint: disable=invalid-name
+        return {"QueueUrl": f"fake://{QueueName}"}
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):  # pylint: disable=invalid-name,unused-argument
+        self._round_trip()
+        message_id = str(next(self._ids))
+        self.messages.append({"MessageId": message_id, "ReceiptHandle": message_id, "Body": MessageBody})
+        return {"MessageId": message_id}
+
+    def send_message_batch(self, QueueUrl, Entries):  # pylint: disable=invalid-name
+        self._round_trip()
+        successful = []
+        for entry in Entries:
+            message_id = str(next(self._ids))
+            self.messages.append({"MessageId": message_id, "ReceiptHandle": message_id, "Body": entry["MessageBody"]})
+            successful.append({"Id": entry["Id"], "MessageId": message_id})
+        return {"Successful": successful, "Failed": []}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, **kwargs):  # pylint: disable=invalid-name,unused-argument
+        self._round_trip()
+        batch = []
+        while self.messages and len(batch) < MaxNumberOfMessages:
+            batch.append(self.messages.popleft())
+        return {"Messages": batch} if batch else {}
+
+    def delete_message_batch(self, QueueUrl, Entries):  # pylint: disable=invalid-name,unused-argument
+        self._round_trip()
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+    def change_message_visibility(self, **kwargs):  # pylint: disable=unused-argument
+        self._round_trip()
@@ -0,0 +1,89 @@
+"""
+Contention benchmark for InventoryStore.
+
+Usage::
+
+    python -m benchmarks.inventory --threads 16 --products 10000 --stripes 1 64
+
+Every thread submits random carts through ShoppingCart.submit_cart_order and
+restocks them afterwards. The report shows checkouts/sec per stripe count and
+verifies that stock never went negative and no units were lost.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+from app.eshop import Product, ShoppingCart
+from app.inventory import InventoryStore
+
+
+def run_contention(threads: int, products: int, stripes: int, cart_lines: int, seconds: float) -> dict:
+    """Hammer one store from many threads and return throughput and consistency checks."""
+    inventory = InventoryStore(stripes=stripes)
+    catalog = [Product(f"Product {i}", 10.0, 1000, inventory=inventory) for i in range(products)]
+    initial_total = 1000 * products
+    counts = [0] * threads
+    rejected = [0] * threads
+    stop = threading.Event()
+
+    def shopper(index: int) -> None:
+        rng = random.Random(index)
+        while not stop.is_set():
+            cart = ShoppingCart()
+            lines = {product: rng.randint(1, 5) for product in rng.sample(catalog, cart_lines)}
+            try:
+                for product, amount in lines.items():
+                    cart.add_product(product, amount)
+                cart.submit_cart_order()
+            except ValueError:
+                rejected[index] += 1
+                continue
+            inventory.restock({product.name: amount for product, amount in lines.items()})
+            counts[index] += 1
+
+    workers = [threading.Thread(target=shopper, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    amounts = [inventory.available(product.name) for product in catalog]
+    return {
+        "threads": threads,
+        "products": products,
+        "stripes": stripes,
+        "checkouts_per_sec": sum(counts) / elapsed,
+        "rejected": sum(rejected),
+        "negative_stock": sum(1 for amount in amounts if amount < 0),
+        "units_lost": initial_total - sum(amounts),
+    }
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure InventoryStore under contention.")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--stripes", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--cart-lines", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    results = [
+        run_contention(args.threads, args.products, stripes, args.cart_lines, args.seconds)
+        for stripes in args.stripes
+    ]
+    json.dump({"results": results}, sys.stdout, indent=2)
+    print()
+    return 1 if any(result["negative_stock"] or result["units_lost"] for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Open-loop load generator for the checkout -> shipping pipeline.
+
+Usage::
+
+    python -m benchmarks.loadgen --target fake --rate 200 --duration 30 --processes 4
+    python -m benchmarks.loadgen --target localstack --rate 50 --duration 60 --output load.json
+    python -m benchmarks.loadgen --target sqlite --replay orders.jsonl --speed 2
+
+Every process places orders through ``Order.place_order`` on a fixed
+schedule, whether or not earlier orders have finished, so a slow backend
+shows up as growing latency instead of a lower request rate. Latency is
+measured from the scheduled start of each order, which includes the time it
+waited for a free thread.
+
+Without ``--replay`` carts are synthesized. A replay log has one JSON object
+per line::
+
+    {"at": 0.25, "shipping_type": "Самовивіз", "products": [["Product", 10.0, 2]], "due_in_seconds": 60}
+
+``at`` is the offset in seconds from the start of the run (lines without it
+are spread evenly at ``--rate``); ``products`` lists (name, price, quantity)
+and ``idempotency_key`` is passed on when present. ``fake`` keeps each
+process's shippings in memory, ``sqlite`` shares one database file between
+the processes and ``localstack`` uses AWS_ENDPOINT_URL.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+from app.eshop import Order, Product, ShoppingCart
+from services import ShippingService
+from services.publisher import ShippingPublisher
+from services.memory_repository import InMemoryShippingRepository, MemoryStore
+from services.sqlite_repository import SQLiteShippingRepository
+from benchmarks.fakes import FakeSQSClient
+from benchmarks.run import percentile
+
+
+def build_service(target: str, sqlite_path: str = None) -> ShippingService:
+    """Return a shipping service for the requested target."""
+    if target == "fake":
+        return ShippingService(InMemoryShippingRepository(MemoryStore()), ShippingPublisher(client=FakeSQSClient()))
+    if target == "sqlite":
+        return ShippingService(SQLiteShippingRepository(sqlite_path), ShippingPublisher(client=FakeSQSClient()))
+    from services.repository import DynamoDBShippingRepository  # pylint: disable=import-outside-toplevel
+    return ShippingService(DynamoDBShippingRepository(), ShippingPublisher())
+
+
+def synthetic_orders(count: int, rate: float, max_lines: int = 5, seed: int = None) -> list[dict]:
+    """Build ``count`` random checkouts spread evenly at ``rate`` orders per second."""
+    rng = random.Random(seed)
+    shipping_types = ShippingService.list_available_shipping_type()
+    return [
+        {
+            "at": i / rate,
+            "shipping_type": rng.choice(shipping_types),
+            "products": [
+                [f"Product {rng.randrange(1000)}", round(rng.uniform(1, 100), 2), rng.randint(1, 3)]
+                for _ in range(rng.randint(1, max_lines))
+            ],
+            "due_in_seconds": rng.randint(60, 3600),
+        }
+        for i in range(count)
+    ]
+
+
+def read_replay(path: str, rate: float, speed: float = 1.0) -> list[dict]:
+    """Read a JSONL request log; offsets are divided by ``speed``."""
+    orders = []
+    with open(path, encoding="utf-8") as log:
+        for line in log:
+            if line.strip():
+                order = json.loads(line)
+                order["at"] = order["at"] / speed if "at" in order else len(orders) / rate
+                orders.append(order)
+    return orders
+
+
+def place(service: ShippingService, order: dict) -> str:
+    """Place one order from its JSON description and return the shipping ID."""
+    cart = ShoppingCart()
+    for name, price, quantity in order["products"]:
+        # Запас із надлишком: навантаження перевіряє доставку, а не склад
+        cart.add_product(Product(name, price, 1_000_000), quantity)
+    due_date = datetime.now(timezone.utc) + timedelta(seconds=order.get("due_in_seconds", 60))
+    return Order(cart, service).place_order(order["shipping_type"], due_date, order.get("idempotency_key"))
+
+
+def run_worker(target: str, sqlite_path: str, orders: list[dict], started_at: float, concurrency: int) -> list:
+    """Place ``orders`` on schedule and return (offset, latency_ns, error) per order.
+
+    ``started_at`` is the wall-clock start of the run shared by all processes;
+    ``error`` is the exception class name or None.
+    """
+    service = build_service(target, sqlite_path)
+    records = []
+    lock = threading.Lock()
+
+    def call(order, scheduled_ns):
+        error = None
+        try:
+            place(service, order)
+        except Exception as exc:  # pylint: disable=broad-except
+            error = type(exc).__name__
+        latency = time.perf_counter_ns() - scheduled_ns
+        with lock:
+            records.append((order["at"], latency, error))
+
+    # Годинник perf_counter прив'язується до спільного часу старту
+    origin_ns = time.perf_counter_ns() - int((time.time() - started_at) * 1e9)
+    with open(os.devnull, "w", encoding="utf-8") as devnull, redirect_stdout(devnull), \
+            ThreadPoolExecutor(concurrency) as pool:
+        for order in orders:
+            scheduled_ns = origin_ns + int(order["at"] * 1e9)
+            delay = (scheduled_ns - time.perf_counter_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(call, order, scheduled_ns)
+    return records
+
+
+def summarize(records: list, interval: float, duration: float) -> dict:
+    """Aggregate worker records into totals and per-interval throughput, latency and errors."""
+
+    def stats(group: list) -> dict:
+        latencies = sorted(latency for _, latency, error in group if error is None)
+        summary = {"orders": len(group), "errors": dict(Counter(error for _, _, error in group if error))}
+        if latencies:
+            summary["latency_ms"] = {
+                "p50": percentile(latencies, 0.50) / 1e6,
+                "p90": percentile(latencies, 0.90) / 1e6,
+                "p99": percentile(latencies, 0.99) / 1e6,
+                "max": latencies[-1] / 1e6,
+            }
+        return summary
+
+    buckets: dict[int, list] = {}
+    for record in records:
+        buckets.setdefault(int(record[0] // interval), []).append(record)
+    timeline = [
+        {"start": index * interval, **stats(group), "ops_per_sec": len(group) / interval}
+        for index, group in sorted(buckets.items())
+    ]
+    total = stats(records)
+    total["ops_per_sec"] = len(records) / duration if duration else 0.0
+    return {"total": total, "timeline": timeline}
+
+
+def run_load(target: str, orders: list[dict], processes: int = 1, concurrency: int = 16, interval: float = 1.0,
+             sqlite_path: str = None) -> dict:
+    """Split ``orders`` between ``processes`` processes, run them and summarize the results."""
+    with ExitStack() as stack:
+        if target == "sqlite" and sqlite_path is None:
+            sqlite_path = os.path.join(stack.enter_context(tempfile.TemporaryDirectory()), "shipping.db")
+        if target == "sqlite":
+            # Схема створюється один раз, до старту процесів
+            SQLiteShippingRepository(sqlite_path)
+        # Невеликий запас, щоб усі процеси встигли стартувати до першого замовлення
+        started_at = time.time() + 0.5
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(run_worker, [
+                (target, sqlite_path, orders[i::processes], started_at, concurrency) for i in range(processes)
+            ])
+        duration = time.time() - started_at
+    return summarize([record for result in results for record in result], interval, duration)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Drive checkouts at a fixed rate and report latency over time.")
+    parser.add_argument("--target", choices=("fake", "sqlite", "localstack"), default="fake")
+    parser.add_argument("--rate", type=float, default=100, help="orders per second across all processes")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of synthetic load")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--concurrency", type=int, default=16, help="threads per process")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds per timeline bucket")
+    parser.add_argument("--replay", help="JSONL request log to replay instead of synthetic carts")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up factor")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--sqlite-path", help="database file for --target sqlite (default: temporary)")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        orders = read_replay(args.replay, args.rate, args.speed)
+    else:
+        orders = synthetic_orders(int(args.rate * args.duration), args.rate, seed=args.seed)
+    orders.sort(key=lambda order: order["at"])
+    report = {
+        "meta": {
+            "target": args.target,
+            "processes": args.processes,
+            "rate": None if args.replay else args.rate,
+            "replay": args.replay,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        **run_load(args.target, orders, args.processes, args.concurrency, args.interval, args.sqlite_path),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
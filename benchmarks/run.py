@@ -0,0 +1,227 @@
+"""
+Benchmarks for the order -> shipping pipeline.
+
+Usage::
+
+    python -m benchmarks.run --target fake --output bench.json
+    python -m benchmarks.run --target moto
+    python -m benchmarks.run --target sqlite
+    python -m benchmarks.run --target localstack --compare bench.json
+
+``fake`` uses the in-memory repository and an in-process SQS stand-in,
+``sqlite`` the SQLite repository in a temporary directory with the same SQS
+stand-in, ``moto`` uses moto's in-process AWS mock (optional dependency) and
+``localstack`` uses AWS_ENDPOINT_URL. Results are
+printed as JSON with ops/sec and latency percentiles per benchmark.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+from app.catalog import ColumnarCart, ColumnarCatalog
+from app.eshop import Order, Product, ShoppingCart
+from services import ShippingService
+from services.publisher import BufferedShippingPublisher, ShippingPublisher
+from services.memory_repository import InMemoryShippingRepository, MemoryStore
+from services.sqlite_repository import SQLiteShippingRepository
+from benchmarks.fakes import FakeSQSClient
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(name: str, operation, iterations: int, setup=None, finish=None) -> dict:
+    """Run ``operation`` ``iterations`` times and summarize its latency.
+
+    ``setup`` builds the arguments of each call outside the timed region;
+    ``finish`` runs once at the end and is counted in the throughput (e.g. flush).
+    """
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        args = setup() if setup else ()
+        call_started = time.perf_counter_ns()
+        operation(*args)
+        latencies.append(time.perf_counter_ns() - call_started)
+    if finish:
+        finish()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "name": name,
+        "iterations": iterations,
+        "ops_per_sec": iterations / sum(latencies) * 1e9 if not finish else iterations / elapsed,
+        "latency_us": {
+            "mean": sum(latencies) / len(latencies) / 1000,
+            "p50": percentile(latencies, 0.50) / 1000,
+            "p90": percentile(latencies, 0.90) / 1000,
+            "p99": percentile(latencies, 0.99) / 1000,
+            "max": latencies[-1] / 1000,
+        },
+    }
+
+
+def build_stack(target: str, stack: ExitStack):
+    """Return (repository, publisher factory) for the requested target."""
+    if target in ("fake", "sqlite"):
+        client = FakeSQSClient()
+        if target == "fake":
+            repository = InMemoryShippingRepository(MemoryStore())
+        else:
+            repository = SQLiteShippingRepository(f"{stack.enter_context(tempfile.TemporaryDirectory())}/shipping.db")
+        return repository, lambda cls=ShippingPublisher, **kwargs: cls(client=client, **kwargs)
+
+    from services import db  # pylint: disable=import-outside-toplevel
+    from services.repository import ShippingRepository  # pylint: disable=import-outside-toplevel
+    if target == "moto":
+        from moto import mock_aws  # pylint: disable=import-outside-toplevel
+        stack.enter_context(mock_aws())
+        db.reset_clients()
+        stack.callback(db.reset_clients)
+    db.create_shipping_table()
+    return ShippingRepository(), lambda cls=ShippingPublisher, **kwargs: cls(**kwargs)
+
+
+def make_cart(lines: int) -> ShoppingCart:
+    cart = ShoppingCart()
+    for i in range(lines):
+        cart.add_product(Product(f"Product {i}", 10.0 + i, 1_000_000), 2)
+    return cart
+
+
+def make_columnar_cart(lines: int) -> ColumnarCart:
+    catalog = ColumnarCatalog()
+    cart = ColumnarCart(catalog)
+    for i in range(lines):
+        cart.add_product(catalog.add_product(f"Product {i}", 10.0 + i, 1_000_000), 2)
+    return cart
+
+
+def run_benchmarks(target: str, iterations: int, selected=None) -> list[dict]:
+    """Run all benchmarks (or those whose name contains one of ``selected``)."""
+    results = []
+    shipping_type = ShippingService.list_available_shipping_type()[0]
+
+    def due_date():
+        return datetime.now(timezone.utc) + timedelta(minutes=5)
+
+    def wanted(name):
+        return not selected or any(part in name for part in selected)
+
+    with ExitStack() as stack:
+        repository, make_publisher = build_stack(target, stack)
+        service = ShippingService(repository, make_publisher())
+
+        if wanted("cart.add_product"):
+            cart = ShoppingCart()
+            products = [Product(f"Product {i}", 10.0, 10) for i in range(iterations)]
+            product_iter = iter(products)
+            results.append(measure("cart.add_product", lambda: cart.add_product(next(product_iter), 1), iterations))
+        if wanted("cart.calculate_total"):
+            cart = make_cart(1000)
+            results.append(measure("cart.calculate_total[1000 lines]", cart.calculate_total, iterations))
+            cart = make_columnar_cart(1000)
+            results.append(measure("columnar_cart.calculate_total[1000 lines]", cart.calculate_total, iterations))
+        if wanted("cart.submit_cart_order"):
+            results.append(measure(
+                "cart.submit_cart_order[10 lines]", ShoppingCart.submit_cart_order, iterations,
+                setup=lambda: (make_cart(10),)
+            ))
+        if wanted("order.place_order"):
+            results.append(measure(
+                "order.place_order", lambda order: order.place_order(shipping_type, due_date()), iterations,
+                setup=lambda: (Order(make_cart(3), service, "order"),)
+            ))
+        if wanted("service.create_shipping"):
+            results.append(measure(
+                "service.create_shipping",
+                lambda: service.create_shipping(shipping_type, ["Product"], "order", due_date()),
+                iterations
+            ))
+        if wanted("service.process_shipping"):
+            shipping_ids = iter(service.create_shippings(
+                [(shipping_type, ["Product"], "order", due_date())] * iterations
+            ).shipping_ids)
+            results.append(measure(
+                "service.process_shipping", service.process_shipping, iterations,
+                setup=lambda: (next(shipping_ids),)
+            ))
+        if wanted("publisher.send_new_shipping"):
+            publisher = make_publisher()
+            results.append(measure("publisher.send_new_shipping", publisher.send_new_shipping, iterations,
+                                   setup=lambda: ("shipping",)))
+        if wanted("publisher.buffered"):
+            publisher = make_publisher(BufferedShippingPublisher)
+            results.append(measure("publisher.buffered.send_new_shipping", publisher.send_new_shipping, iterations,
+                                   setup=lambda: ("shipping",), finish=publisher.close))
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: list[dict], baseline_path: str, threshold: float) -> list[str]:
+    """Return the names of benchmarks that got slower than ``threshold`` compared to a baseline."""
+    with open(baseline_path, encoding="utf-8") as baseline_file:
+        baseline = {result["name"]: result for result in json.load(baseline_file)["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["name"])
+        if previous and result["ops_per_sec"] < previous["ops_per_sec"] * (1 - threshold):
+            regressions.append(result["name"])
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the order -> shipping pipeline.")
+    parser.add_argument("--target", choices=("fake", "sqlite", "moto", "localstack"), default="fake")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--only", nargs="*", help="run only benchmarks whose name contains one of these")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed ops/sec drop vs. baseline")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "target": args.target,
+            "python": platform.python_version(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+    }
+    # Order.place_order друкує дату доставки, а stdout потрібен для звіту
+    with redirect_stdout(sys.stderr):
+        report["results"] = run_benchmarks(args.target, args.iterations, args.only)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        regressions = compare(report["results"], args.compare, args.threshold)
+        for name in regressions:
+            print(f"Regression: {name}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Startup benchmark: import and construction time in fresh interpreters.
+
+Usage::
+
+    python -m benchmarks.startup --runs 5
+
+Each scenario runs in a new ``python`` process and reports the median wall time
+of its statement and whether it loaded botocore. Scenarios that must stay
+light (cart code, constructing the service) fail the run if they load
+botocore or exceed ``--budget-ms``.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# (назва, код, чи дозволено завантажувати botocore)
+SCENARIOS = [
+    ("import app.eshop", "import app.eshop", False),
+    ("cart", "from app.eshop import Product, ShoppingCart\n"
+             "cart = ShoppingCart()\n"
+             "cart.add_product(Product('Product', 10.0, 5), 2)\n"
+             "cart.calculate_total()", False),
+    ("construct service", "from services.service import ShippingService\n"
+                          "from services.repository import ShippingRepository\n"
+                          "from services.publisher import ShippingPublisher\n"
+                          "ShippingService(ShippingRepository(), ShippingPublisher())", False),
+    ("create sqs client", "from services.publisher import ShippingPublisher\n"
+                          "ShippingPublisher().client", True),
+]
+
+_CHILD = """
+import sys, time
+started = time.perf_counter()
+exec(compile({code!r}, "<scenario>", "exec"))
+elapsed = time.perf_counter() - started
+print(elapsed, "botocore" in sys.modules)
+"""
+
+
+def run_scenario(code: str, runs: int) -> dict:
+    """Run ``code`` in ``runs`` fresh interpreters and summarize the timings."""
+    timings = []
+    loaded_botocore = False
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _CHILD.format(code=code)], capture_output=True, text=True, check=True
+        ).stdout.split()
+        timings.append(float(output[0]) * 1000)
+        loaded_botocore = loaded_botocore or output[1] == "True"
+    return {"median_ms": statistics.median(timings), "max_ms": max(timings), "loads_botocore": loaded_botocore}
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure import and construction time of the e-shop.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if a light scenario's median time exceeds this")
+    args = parser.parse_args(argv)
+
+    results = []
+    failed = False
+    for name, code, may_load_botocore in SCENARIOS:
+        result = {"name": name, **run_scenario(code, args.runs)}
+        result["ok"] = may_load_botocore or (
+            not result["loads_botocore"] and (args.budget_ms is None or result["median_ms"] <= args.budget_ms)
+        )
+        failed = failed or not result["ok"]
+        results.append(result)
+    json.dump({"results": results}, sys.stdout, indent=2)
+    print()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,9 @@
-from .service import ShippingService
\ No newline at end of file
+def __getattr__(name):
+    # Імпортуємо сервіс (і boto3 разом з ним) лише коли він справді потрібен
+    if name == "ShippingService":
+        from .service import ShippingService  # pylint: disable=import-outside-toplevel
+        return ShippingService
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["ShippingService"]
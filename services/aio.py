@@ -0,0 +1,217 @@
+"""
+Asyncio variants of the shipping repository, publisher and service.
+
+Requires the optional ``aiobotocore`` package. All clients created in one event
+loop share a single aiobotocore session and connection pool; call
+``close_async_clients()`` before the loop is closed.
+"""
+
+import asyncio
+import uuid
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from .codec import decode_item
+from .config import AWS_ENDPOINT_URL, AWS_REGION, AWS_ASYNC_MAX_POOL_CONNECTIONS, SHIPPING_QUEUE, SHIPPING_TABLE_NAME
+from .metrics import instrument_client
+from .repository import build_shipping_item, finish_shipping_updates, projection
+from .resilience import Resilience, get_resilience
+from .service import ShippingService, ShippingStateError
+
+_session = None
+_clients: dict = {}
+_exit_stacks: dict = {}
+_locks: dict = {}
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+async def get_async_client(service_name: str, **kwargs):
+    """Return a pooled aiobotocore client for the running event loop and these client arguments."""
+    global _session  # pylint: disable=global-statement
+    loop = asyncio.get_running_loop()
+    # Різні аргументи (облікові дані, конфіг) - різні клієнти
+    key = (loop, service_name, tuple(sorted(kwargs.items())))
+    if key in _clients:
+        return _clients[key]
+    lock = _locks.setdefault(loop, asyncio.Lock())
+    async with lock:
+        if key not in _clients:
+            if _session is None:
+                _session = get_session()
+            stack = _exit_stacks.setdefault(loop, AsyncExitStack())
+            client = await stack.enter_async_context(_session.create_client(
+                service_name,
+                endpoint_url=AWS_ENDPOINT_URL,
+                region_name=AWS_REGION,
+                config=AioConfig(max_pool_connections=AWS_ASYNC_MAX_POOL_CONNECTIONS),
+                **kwargs
+            ))
+            _clients[key] = instrument_client(client)
+    return _clients[key]
+
+
+async def close_async_clients() -> None:
+    """Close all clients created in the running event loop."""
+    loop = asyncio.get_running_loop()
+    stack = _exit_stacks.pop(loop, None)
+    for key in [key for key in _clients if key[0] is loop]:
+        del _clients[key]
+    _locks.pop(loop, None)
+    if stack is not None:
+        await stack.aclose()
+
+
+def _serialize(item: dict) -> dict:
+    return {key: _serializer.serialize(value) for key, value in item.items()}
+
+
+def _deserialize(item: dict) -> dict:
+    return {key: _deserializer.deserialize(value) for key, value in item.items()}
+
+
+class AsyncShippingRepository:
+    """Asyncio counterpart of ShippingRepository."""
+
+    def __init__(self, table_name: str = SHIPPING_TABLE_NAME, resilience: Resilience = None):
+        self.table_name = table_name
+        self.resilience = resilience or get_resilience()
+
+    async def _call(self, operation: str, **kwargs):
+        client = await get_async_client("dynamodb")
+        return await self.resilience.call_async(f"dynamodb.{operation}", getattr(client, operation), **kwargs)
+
+    async def get_shipping(self, shipping_id, attributes: list = None):
+        request = projection(attributes) if attributes else {}
+        response = await self._call(
+            "get_item", TableName=self.table_name, Key=_serialize({"shipping_id": shipping_id}), **request
+        )
+        item = response.get("Item")
+        return decode_item(_deserialize(item)) if item else None
+
+    async def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime):
+        item = build_shipping_item(shipping_type, product_ids, order_id, status, due_date)
+        await self._call("put_item", TableName=self.table_name, Item=_serialize(item))
+        return item["shipping_id"]
+
+    async def update_shipping_status(self, shipping_id, status):
+        return await self._call(
+            "update_item",
+            TableName=self.table_name,
+            Key=_serialize({"shipping_id": shipping_id}),
+            UpdateExpression='SET shipping_status = :sh_status',
+            ExpressionAttributeValues=_serialize({':sh_status': status})
+        )
+
+    async def finish_shipping(self, shipping_id, now: datetime, on_time_status: str, late_status: str, terminal_statuses: tuple):
+        client = await get_async_client("dynamodb")
+        for update in finish_shipping_updates(now, on_time_status, late_status, terminal_statuses):
+            update["ExpressionAttributeValues"] = _serialize(update["ExpressionAttributeValues"])
+            try:
+                response = await self._call(
+                    "update_item", TableName=self.table_name, Key=_serialize({"shipping_id": shipping_id}), **update
+                )
+            except client.exceptions.ConditionalCheckFailedException:
+                continue
+            response["Attributes"] = decode_item(_deserialize(response["Attributes"]))
+            return response
+        return None
+
+
+class AsyncShippingPublisher:
+    """Asyncio counterpart of ShippingPublisher; the queue URL is resolved on first use."""
+
+    def __init__(self, queue_name: str = SHIPPING_QUEUE, resilience: Resilience = None):
+        """Initialize the publisher for the given queue."""
+        self.queue_name = queue_name
+        self.queue_url = None
+        self.resilience = resilience or get_resilience()
+
+    async def _call(self, operation: str, **kwargs):
+        client = await get_async_client("sqs", aws_access_key_id="test", aws_secret_access_key="test")
+        if self.queue_url is None:
+            try:
+                response = await self.resilience.call_async(
+                    "sqs.get_queue_url", client.get_queue_url, QueueName=self.queue_name
+                )
+            except client.exceptions.QueueDoesNotExist:
+                response = await self.resilience.call_async(
+                    "sqs.create_queue", client.create_queue, QueueName=self.queue_name
+                )
+            self.queue_url = response["QueueUrl"]
+        return await self.resilience.call_async(
+            f"sqs.{operation}", getattr(client, operation), QueueUrl=self.queue_url, **kwargs
+        )
+
+    async def send_new_shipping(self, shipping_id: str) -> str:
+        """Send a new shipping ID to the SQS queue."""
+        response = await self._call("send_message", MessageBody=shipping_id)
+        return response['MessageId']
+
+    async def poll_shipping(self, batch_size: int = 10) -> list[str]:
+        """Poll messages from the SQS queue."""
+        messages = await self._call(
+            "receive_message",
+            MaxNumberOfMessages=batch_size,
+            WaitTimeSeconds=10
+        )
+        return [msg['Body'] for msg in messages.get('Messages', [])]
+
+
+class AsyncShippingService:
+    """Asyncio counterpart of ShippingService."""
+
+    SHIPPING_CREATED: str = ShippingService.SHIPPING_CREATED
+    SHIPPING_IN_PROGRESS: str = ShippingService.SHIPPING_IN_PROGRESS
+    SHIPPING_COMPLETED: str = ShippingService.SHIPPING_COMPLETED
+    SHIPPING_FAILED: str = ShippingService.SHIPPING_FAILED
+    TERMINAL_STATUSES: tuple = ShippingService.TERMINAL_STATUSES
+
+    list_available_shipping_type = staticmethod(ShippingService.list_available_shipping_type)
+
+    def __init__(self, repository: AsyncShippingRepository, publisher: AsyncShippingPublisher):
+        """Initialize AsyncShippingService with repository and publisher."""
+        self.repository = repository
+        self.publisher = publisher
+
+    async def create_shipping(self, shipping_type: str, product_ids: list[str], order_id: str, due_date: datetime) -> str:
+        """Create a new shipping record and send it to the queue."""
+        if shipping_type not in self.list_available_shipping_type():
+            raise ValueError("Shipping type is not available")
+        shipping_id = await self.repository.create_shipping(
+            shipping_type, product_ids, order_id, self.SHIPPING_CREATED, due_date
+        )
+        if not shipping_id:
+            shipping_id = str(uuid.uuid4())
+        await self.publisher.send_new_shipping(shipping_id)
+        return shipping_id
+
+    async def process_shipping(self, shipping_id: str) -> dict:
+        """Process a shipping by checking its due date and updating status in one conditional write."""
+        response = await self.repository.finish_shipping(
+            shipping_id, datetime.now(timezone.utc),
+            self.SHIPPING_COMPLETED, self.SHIPPING_FAILED, self.TERMINAL_STATUSES
+        )
+        if response is None:
+            raise ShippingStateError(f"Shipping {shipping_id} does not exist or is already processed")
+        return response['ResponseMetadata']
+
+    async def check_status(self, shipping_id: str) -> str:
+        """Check the status of a shipping."""
+        shipping = await self.repository.get_shipping(shipping_id, attributes=["shipping_status"])
+        return shipping['shipping_status']
+
+    async def fail_shipping(self, shipping_id: str) -> dict:
+        """Mark a shipping as failed."""
+        response = await self.repository.update_shipping_status(shipping_id, self.SHIPPING_FAILED)
+        return response['ResponseMetadata']
+
+    async def complete_shipping(self, shipping_id: str) -> dict:
+        """Mark a shipping as completed."""
+        response = await self.repository.update_shipping_status(shipping_id, self.SHIPPING_COMPLETED)
+        return response['ResponseMetadata']
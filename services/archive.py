@@ -0,0 +1,240 @@
+"""
+Archival of completed and failed shippings to compressed files.
+
+Run it with ``python -m services.archive``.
+"""
+
+import argparse
+import gzip
+import importlib.util
+import io
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from .config import (
+    SHIPPING_ARCHIVE_PATH,
+    SHIPPING_ARCHIVE_SEGMENTS,
+    SHIPPING_ARCHIVE_CHUNK_SIZE,
+    SHIPPING_ARCHIVE_CHECKPOINT_PATH,
+)
+from .db import get_client
+from .metrics import get_metrics
+from .repository import DynamoDBShippingRepository
+from .service import ShippingService
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("shipping_id", "shipping_type", "order_id", "product_ids", "shipping_status", "created_date", "due_date",
+           "idempotency_key")
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode_jsonl(items: list) -> bytes:
+    """Encode decoded shipping items as gzip-compressed JSON lines."""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb") as file:
+        for item in items:
+            file.write(json.dumps(item, ensure_ascii=False, default=_json_default).encode("utf-8"))
+            file.write(b"\n")
+    return buffer.getvalue()
+
+
+def encode_parquet(items: list) -> bytes:
+    """Encode decoded shipping items as a zstd-compressed Parquet file (requires pyarrow)."""
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+    import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+    timestamp = pa.timestamp("ms", tz="UTC")
+    schema = pa.schema([
+        ("shipping_id", pa.string()),
+        ("shipping_type", pa.string()),
+        ("order_id", pa.string()),
+        ("product_ids", pa.list_(pa.string())),
+        ("shipping_status", pa.string()),
+        ("created_date", timestamp),
+        ("due_date", timestamp),
+        ("idempotency_key", pa.string()),
+    ])
+    table = pa.Table.from_pylist([{column: item.get(column) for column in COLUMNS} for item in items], schema=schema)
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression="zstd")
+    return buffer.getvalue()
+
+
+FORMATS = {"jsonl": ("jsonl.gz", encode_jsonl), "parquet": ("parquet", encode_parquet)}
+
+
+def write_file(destination: str, name: str, data: bytes) -> str:
+    """Write ``data`` under a local directory or an ``s3://bucket/prefix`` and return its location."""
+    if destination.startswith("s3://"):
+        bucket, _, prefix = destination[len("s3://"):].partition("/")
+        key = f"{prefix.strip('/')}/{name}" if prefix.strip("/") else name
+        get_client("s3").put_object(Bucket=bucket, Key=key, Body=data)
+        return f"s3://{bucket}/{key}"
+    path = os.path.join(destination, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Тимчасовий файл, щоб читачі ніколи не бачили недописаний шматок
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(data)
+    os.replace(temporary_path, path)
+    return path
+
+
+class ShippingArchiver:
+    """Move terminal shippings from the table to compressed files.
+
+    Every scan segment runs in its own thread and keeps at most one chunk
+    (``chunk_size`` items plus one page) in memory. A full chunk is written as
+    one file and then deleted from the table. With ``checkpoint_path`` each
+    segment's scan position is saved after every chunk, so an interrupted run
+    resumes where it stopped; the checkpoint is removed when all segments
+    finish. Archiving is at-least-once: a crash between writing a file and
+    deleting its items archives them again on the next run, so readers should
+    deduplicate by shipping_id.
+    """
+
+    def __init__(
+        self,
+        repository: DynamoDBShippingRepository,
+        destination: str = SHIPPING_ARCHIVE_PATH,
+        segments: int = SHIPPING_ARCHIVE_SEGMENTS,
+        chunk_size: int = SHIPPING_ARCHIVE_CHUNK_SIZE,
+        checkpoint_path: str = SHIPPING_ARCHIVE_CHECKPOINT_PATH,
+        file_format: str = "auto",
+        statuses: tuple = ShippingService.TERMINAL_STATUSES,
+        page_size: int = 100,
+        delete: bool = True,
+    ):
+        """Initialize the archiver; ``file_format`` "auto" picks Parquet when pyarrow is installed."""
+        if file_format == "auto":
+            file_format = "parquet" if parquet_available() else "jsonl"
+        self.repository = repository
+        self.destination = destination
+        self.segments = segments
+        self.chunk_size = chunk_size
+        self.checkpoint_path = checkpoint_path
+        self.extension, self._encode = FORMATS[file_format]
+        self.statuses = statuses
+        self.page_size = page_size
+        self.delete = delete
+        self.archived = 0
+        self.files: list[str] = []
+        self._run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        # segment -> {"key": позиція сканування, "done": чи завершено, "chunks": кількість файлів}
+        self._state: dict[int, dict] = {}
+
+    def run(self) -> int:
+        """Archive every matching shipping and return how many were archived in this run."""
+        self.load_checkpoint()
+        pending = [segment for segment in range(self.segments) if not self._state[segment]["done"]]
+        with ThreadPoolExecutor(max(1, len(pending)), thread_name_prefix="shipping-archive") as pool:
+            # list() піднімає першу помилку сегмента; решта сегментів уже зберегли свої позиції
+            list(pool.map(self._archive_segment, pending))
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        return self.archived
+
+    def _archive_segment(self, segment: int) -> None:
+        chunk = []
+        pages = self.repository.scan_pages(
+            self.statuses, segment, self.segments, self.page_size, self._state[segment]["key"]
+        )
+        for items, last_key in pages:
+            chunk.extend(items)
+            if len(chunk) >= self.chunk_size or last_key is None:
+                self._flush(segment, chunk, last_key)
+                chunk = []
+
+    def _flush(self, segment: int, items: list, last_key: dict) -> None:
+        with self._lock:
+            state = self._state[segment]
+            number = state["chunks"]
+        if items:
+            name = f"segment={segment:04d}/part-{self._run_id}-{number:05d}.{self.extension}"
+            location = write_file(self.destination, name, self._encode(items))
+            if self.delete:
+                self.repository.delete_shippings([item["shipping_id"] for item in items])
+            get_metrics().increment("archived_shippings_total", len(items))
+            logger.info("Archived %d shippings to %s", len(items), location)
+        with self._lock:
+            if items:
+                self.archived += len(items)
+                self.files.append(location)
+                state["chunks"] += 1
+            state["key"] = last_key
+            state["done"] = last_key is None
+        self.save_checkpoint()
+
+    def save_checkpoint(self) -> None:
+        """Atomically write the scan position of every segment to checkpoint_path."""
+        if not self.checkpoint_path:
+            return
+        with self._lock:
+            checkpoint = {
+                "saved_at": datetime.now(timezone.utc).isoformat(),
+                "segments": self.segments,
+                "state": {str(segment): dict(state) for segment, state in self._state.items()},
+            }
+            temporary_path = f"{self.checkpoint_path}.tmp"
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                json.dump(checkpoint, file, default=_json_default)
+            os.replace(temporary_path, self.checkpoint_path)
+
+    def load_checkpoint(self) -> bool:
+        """Restore segment positions from checkpoint_path; return whether a checkpoint was found."""
+        self._state = {segment: {"key": None, "done": False, "chunks": 0} for segment in range(self.segments)}
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path, encoding="utf-8") as file:
+            checkpoint = json.load(file)
+        # Позиції сегментів мають сенс лише з тією самою кількістю сегментів
+        self.segments = checkpoint["segments"]
+        self._state = {int(segment): state for segment, state in checkpoint["state"].items()}
+        return True
+
+
+def main(argv: list[str] = None) -> None:
+    """Command line entry point for the shipping archiver."""
+    parser = argparse.ArgumentParser(description="Move completed and failed shippings to compressed files.")
+    parser.add_argument("--destination", default=SHIPPING_ARCHIVE_PATH, help="directory or s3://bucket/prefix")
+    parser.add_argument("--segments", type=int, default=SHIPPING_ARCHIVE_SEGMENTS)
+    parser.add_argument("--chunk-size", type=int, default=SHIPPING_ARCHIVE_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", default=SHIPPING_ARCHIVE_CHECKPOINT_PATH)
+    parser.add_argument("--format", choices=("auto", *FORMATS), default="auto")
+    parser.add_argument("--keep", action="store_true", help="export without deleting from the table")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    archiver = ShippingArchiver(
+        DynamoDBShippingRepository(),
+        destination=args.destination,
+        segments=args.segments,
+        chunk_size=args.chunk_size,
+        checkpoint_path=args.checkpoint,
+        file_format=args.format,
+        delete=not args.keep,
+    )
+    archived = archiver.run()
+    logger.info("Archived %d shippings in %d files", archived, len(archiver.files))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .config import SHIPPING_CACHE_MAX_SIZE, SHIPPING_CACHE_TTL_SECONDS
+from .repository import project_item
+
+
+@dataclass
+class CacheStats:
+    """Counters of a CachedShippingRepository."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+
+class CachedShippingRepository:
+    """Read-through LRU/TTL cache in front of a shipping repository.
+
+    Writes made through the cache update or invalidate cached entries, so reads
+    never return a status older than this process's own writes. Methods that
+    are not cached are delegated to the wrapped repository.
+    """
+
+    def __init__(self, repository, max_size: int = SHIPPING_CACHE_MAX_SIZE,
+                 ttl_seconds: float = SHIPPING_CACHE_TTL_SECONDS, clock=time.monotonic):
+        self.repository = repository
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        # shipping_id -> (expires_at, item або None для інвалідованого запису, write_seq)
+        self._entries: OrderedDict = OrderedDict()
+        self._write_seq = 0
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+    def get_shipping(self, shipping_id, attributes: list = None):
+        with self._lock:
+            item = self._lookup(shipping_id)
+            seq = self._write_seq
+        if item is None:
+            # Повний запис, щоб з кешу можна було віддати будь-яку проєкцію
+            item = self.repository.get_shipping(shipping_id)
+            if item is None:
+                return None
+            self._store(shipping_id, item, seq)
+        return project_item(item, attributes)
+
+    def get_shippings(self, shipping_ids: list, attributes: list = None, consistent_read: bool = False) -> dict:
+        shippings, missing = {}, []
+        with self._lock:
+            for shipping_id in dict.fromkeys(shipping_ids):
+                item = None if consistent_read else self._lookup(shipping_id)
+                if item is None:
+                    missing.append(shipping_id)
+                else:
+                    shippings[shipping_id] = item
+            seq = self._write_seq
+        if missing:
+            # Завантажуємо повні записи, щоб їх можна було закешувати
+            fetched = self.repository.get_shippings(missing, consistent_read=consistent_read)
+            for shipping_id, item in fetched.items():
+                self._store(shipping_id, item, seq)
+            shippings.update(fetched)
+        return {shipping_id: project_item(item, attributes) for shipping_id, item in shippings.items()}
+
+    def create_shipping(self, *args, **kwargs):
+        shipping_id = self.repository.create_shipping(*args, **kwargs)
+        self.invalidate(shipping_id)
+        return shipping_id
+
+    def update_shipping_status(self, shipping_id, status):
+        response = self.repository.update_shipping_status(shipping_id, status)
+        self._merge(shipping_id, {"shipping_status": status})
+        return response
+
+    def finish_shipping(self, shipping_id, *args, **kwargs):
+        response = self.repository.finish_shipping(shipping_id, *args, **kwargs)
+        # Відповідь містить лише змінені атрибути; без відповіді запис інвалідовується
+        self._merge(shipping_id, response.get("Attributes") if response else None)
+        return response
+
+    def invalidate(self, shipping_id) -> None:
+        """Forget a cached shipping; reads that started earlier will not re-cache it."""
+        with self._lock:
+            self._write_seq += 1
+            self._put(shipping_id, None, self._write_seq)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _merge(self, shipping_id, updated: dict) -> None:
+        with self._lock:
+            self._write_seq += 1
+            entry = self._entries.get(shipping_id)
+            item = None
+            if updated and entry is not None and entry[1] is not None:
+                item = {**entry[1], **updated}
+            self._put(shipping_id, item, self._write_seq)
+
+    def _lookup(self, shipping_id):
+        entry = self._entries.get(shipping_id)
+        if entry is not None and entry[1] is not None:
+            if entry[0] > self._clock():
+                self._entries.move_to_end(shipping_id)
+                self.stats.hits += 1
+                return entry[1]
+            del self._entries[shipping_id]
+            self.stats.expirations += 1
+        self.stats.misses += 1
+        return None
+
+    def _store(self, shipping_id, item, seq) -> None:
+        with self._lock:
+            entry = self._entries.get(shipping_id)
+            if entry is not None and entry[2] > seq:
+                # Запис змінили, поки ми читали з бази - відповідь уже застаріла
+                return
+            self._put(shipping_id, dict(item), seq)
+
+    def _put(self, shipping_id, item, seq) -> None:
+        self._entries[shipping_id] = (self._clock() + self.ttl_seconds, item, seq)
+        self._entries.move_to_end(shipping_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
@@ -0,0 +1,89 @@
+"""
+Versioned encoding of shipping items.
+
+Version 1 items (written before the codec existed) keep ``product_ids`` as a
+comma-joined string and ``created_date``/``due_date`` as ISO strings. Version 2
+items carry ``v: 2``, store ``product_ids`` as a native list and the dates as
+epoch seconds with millisecond precision in ``created_at``/``due_at``; numbers
+sort correctly in indexes and ``due_at`` can serve as a TTL attribute.
+
+Repositories return decoded items: ``product_ids`` is a list and
+``created_date``/``due_date`` are timezone-aware datetimes, whatever the stored
+version.
+"""
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+ITEM_VERSION = 2
+
+# Назва в декодованому елементі -> атрибут версії 2 (у версії 1 назви збігаються)
+DATE_ATTRIBUTES = {"created_date": "created_at", "due_date": "due_at"}
+_ENCODED_ATTRIBUTES = {"v", "product_ids", *DATE_ATTRIBUTES, *DATE_ATTRIBUTES.values()}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def to_epoch(value: datetime) -> Decimal:
+    """Convert a datetime (naive values are UTC) to epoch seconds truncated to milliseconds."""
+    value = value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+    # Цілочисельне ділення без float: збережена дата ніколи не пізніша за справжню
+    return Decimal((value - _EPOCH) // _MILLISECOND) / 1000
+
+
+def from_epoch(value) -> datetime:
+    return datetime.fromtimestamp(float(value), timezone.utc)
+
+
+def encode_item(shipping_id: str, shipping_type: str, product_ids: list, order_id: str, status: str,
+                due_date: datetime, created_date: datetime = None) -> dict:
+    """Build a version 2 item."""
+    return {
+        "shipping_id": shipping_id,
+        "shipping_type": shipping_type,
+        "order_id": order_id,
+        "product_ids": list(product_ids),
+        "shipping_status": status,
+        "created_at": to_epoch(created_date or datetime.now(timezone.utc)),
+        "due_at": to_epoch(due_date),
+        "v": ITEM_VERSION,
+    }
+
+
+def decode_item(item: dict) -> dict:
+    """Turn a stored item of any version into its decoded form."""
+    if item is None:
+        return None
+    decoded = {key: value for key, value in item.items() if key not in _ENCODED_ATTRIBUTES}
+    product_ids = item.get("product_ids")
+    if isinstance(product_ids, str):
+        decoded["product_ids"] = product_ids.split(",") if product_ids else []
+    elif product_ids is not None:
+        decoded["product_ids"] = list(product_ids)
+    for name, epoch_name in DATE_ATTRIBUTES.items():
+        if epoch_name in item:
+            decoded[name] = from_epoch(item[epoch_name])
+        elif name in item:
+            decoded[name] = datetime.fromisoformat(item[name])
+    return decoded
+
+
+def upgrade_item(item: dict) -> dict:
+    """Re-encode a stored item of any version as a version 2 item, keeping extra attributes."""
+    decoded = decode_item(item)
+    upgraded = {key: value for key, value in decoded.items() if key not in DATE_ATTRIBUTES}
+    for name, epoch_name in DATE_ATTRIBUTES.items():
+        if name in decoded:
+            upgraded[epoch_name] = to_epoch(decoded[name])
+    upgraded["v"] = ITEM_VERSION
+    return upgraded
+
+
+def stored_attributes(attributes: list) -> list:
+    """Map decoded attribute names to the stored names of every version, for projections."""
+    names = []
+    for name in attributes:
+        names.append(name)
+        if name in DATE_ATTRIBUTES:
+            names.append(DATE_ATTRIBUTES[name])
+    return list(dict.fromkeys(names))
@@ -4,3 +4,56 @@ AWS_ENDPOINT_URL = os.getenv("AWS_ENDPOINT_URL", "http://localhost:4566")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 SHIPPING_TABLE_NAME = os.getenv("SHIPPING_TABLE_NAME", "ShippingTable")
 SHIPPING_QUEUE = os.getenv("SHIPPING_QUEUE_NAME", "ShippingQueue")
+SHIPPING_OUTBOX_TABLE_NAME = os.getenv("SHIPPING_OUTBOX_TABLE_NAME", "ShippingOutbox")
+SHIPPING_TABLE_ACTIVE_TIMEOUT_SECONDS = float(os.getenv("SHIPPING_TABLE_ACTIVE_TIMEOUT_SECONDS", "900"))
+
+SHIPPING_PUBLISH_BATCH_SIZE = int(os.getenv("SHIPPING_PUBLISH_BATCH_SIZE", "10"))
+SHIPPING_PUBLISH_LINGER_SECONDS = float(os.getenv("SHIPPING_PUBLISH_LINGER_SECONDS", "0.05"))
+SHIPPING_PUBLISH_MAX_RETRIES = int(os.getenv("SHIPPING_PUBLISH_MAX_RETRIES", "3"))
+
+SHIPPING_WORKER_CONCURRENCY = int(os.getenv("SHIPPING_WORKER_CONCURRENCY", str(os.cpu_count() or 4)))
+SHIPPING_WORKER_VISIBILITY_TIMEOUT = int(os.getenv("SHIPPING_WORKER_VISIBILITY_TIMEOUT", "30"))
+# Після стількох невдалих доставок повідомлення переноситься в DLQ; 0 вимикає перенесення
+SHIPPING_WORKER_MAX_RECEIVE_COUNT = int(os.getenv("SHIPPING_WORKER_MAX_RECEIVE_COUNT", "5"))
+SHIPPING_DEAD_LETTER_QUEUE = os.getenv(
+    "SHIPPING_DEAD_LETTER_QUEUE_NAME",
+    f"{SHIPPING_QUEUE.removesuffix('.fifo')}-dlq{'.fifo' if SHIPPING_QUEUE.endswith('.fifo') else ''}",
+)
+
+AWS_ASYNC_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_ASYNC_MAX_POOL_CONNECTIONS", "100"))
+
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+AWS_TCP_KEEPALIVE = os.getenv("AWS_TCP_KEEPALIVE", "true").lower() in ("1", "true", "yes")
+AWS_RETRY_MODE = os.getenv("AWS_RETRY_MODE", "standard")
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "3"))
+
+SHIPPING_CACHE_MAX_SIZE = int(os.getenv("SHIPPING_CACHE_MAX_SIZE", "10000"))
+SHIPPING_CACHE_TTL_SECONDS = float(os.getenv("SHIPPING_CACHE_TTL_SECONDS", "5"))
+
+SHIPPING_OUTBOX_RELAY_INTERVAL_SECONDS = float(os.getenv("SHIPPING_OUTBOX_RELAY_INTERVAL_SECONDS", "1"))
+
+SHIPPING_IDEMPOTENCY_CACHE_SIZE = int(os.getenv("SHIPPING_IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+SHIPPING_METRICS_PORT = int(os.getenv("SHIPPING_METRICS_PORT", "0"))
+
+SHIPPING_RETRY_MAX_ATTEMPTS = int(os.getenv("SHIPPING_RETRY_MAX_ATTEMPTS", "4"))
+SHIPPING_RETRY_BASE_DELAY_SECONDS = float(os.getenv("SHIPPING_RETRY_BASE_DELAY_SECONDS", "0.05"))
+SHIPPING_RETRY_MAX_DELAY_SECONDS = float(os.getenv("SHIPPING_RETRY_MAX_DELAY_SECONDS", "2"))
+SHIPPING_RETRY_BUDGET = float(os.getenv("SHIPPING_RETRY_BUDGET", "100"))
+SHIPPING_RETRY_BUDGET_REFILL_PER_SECOND = float(os.getenv("SHIPPING_RETRY_BUDGET_REFILL_PER_SECOND", "10"))
+SHIPPING_BREAKER_FAILURE_THRESHOLD = int(os.getenv("SHIPPING_BREAKER_FAILURE_THRESHOLD", "10"))
+SHIPPING_BREAKER_RESET_SECONDS = float(os.getenv("SHIPPING_BREAKER_RESET_SECONDS", "30"))
+
+# dynamodb, memory або sqlite
+SHIPPING_BACKEND = os.getenv("SHIPPING_BACKEND", "dynamodb")
+SHIPPING_SQLITE_PATH = os.getenv("SHIPPING_SQLITE_PATH", "shipping.db")
+
+SHIPPING_SCHEDULER_LEAD_SECONDS = float(os.getenv("SHIPPING_SCHEDULER_LEAD_SECONDS", "1"))
+SHIPPING_SCHEDULER_HORIZON_SECONDS = float(os.getenv("SHIPPING_SCHEDULER_HORIZON_SECONDS", "300"))
+SHIPPING_SCHEDULER_REFRESH_SECONDS = float(os.getenv("SHIPPING_SCHEDULER_REFRESH_SECONDS", "30"))
+SHIPPING_SCHEDULER_CHECKPOINT_PATH = os.getenv("SHIPPING_SCHEDULER_CHECKPOINT_PATH", "")
+
+SHIPPING_ARCHIVE_PATH = os.getenv("SHIPPING_ARCHIVE_PATH", "archive")
+SHIPPING_ARCHIVE_SEGMENTS = int(os.getenv("SHIPPING_ARCHIVE_SEGMENTS", "4"))
+SHIPPING_ARCHIVE_CHUNK_SIZE = int(os.getenv("SHIPPING_ARCHIVE_CHUNK_SIZE", "10000"))
+SHIPPING_ARCHIVE_CHECKPOINT_PATH = os.getenv("SHIPPING_ARCHIVE_CHECKPOINT_PATH", "")
@@ -1,9 +1,215 @@
-import boto3
-from .config import AWS_ENDPOINT_URL, AWS_REGION
+import os
+import threading
+import time
+
+from .config import (
+    AWS_ENDPOINT_URL,
+    AWS_REGION,
+    AWS_MAX_POOL_CONNECTIONS,
+    AWS_TCP_KEEPALIVE,
+    AWS_RETRY_MODE,
+    AWS_MAX_ATTEMPTS,
+    SHIPPING_TABLE_NAME,
+    SHIPPING_OUTBOX_TABLE_NAME,
+    SHIPPING_TABLE_ACTIVE_TIMEOUT_SECONDS,
+)
+from .metrics import instrument_client
+
+# Індекс за епохою (версія 2 елементів); старий shipping_status-due_date-index з рядковим
+# due_date на існуючих таблицях лишається, доки елементи не мігровано
+STATUS_DUE_DATE_INDEX = "shipping_status-due_at-index"
+ORDER_ID_INDEX = "order_id-index"
+
+# Один процес - одна сесія boto3, клієнти кешуються, тому конструювати
+# репозиторії та паблішери можна скільки завгодно разів. boto3 імпортується
+# під час створення першої сесії, а не під час імпорту модуля.
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_queue_urls = {}
+_local = threading.local()
+
+
+def get_client_config() -> "botocore.config.Config":
+    from botocore.config import Config  # pylint: disable=import-outside-toplevel
+    return Config(
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=AWS_TCP_KEEPALIVE,
+        retries={"mode": AWS_RETRY_MODE, "max_attempts": AWS_MAX_ATTEMPTS},
+    )
+
+
+def get_session() -> "boto3.session.Session":
+    global _session  # pylint: disable=global-statement
+    with _lock:
+        if _session is None:
+            import boto3  # pylint: disable=import-outside-toplevel
+            _session = boto3.session.Session(region_name=AWS_REGION)
+        return _session
+
+
+def get_client(service_name: str, **kwargs):
+    """Return a process-wide client; boto3 clients are safe to share between threads."""
+    key = (service_name, tuple(sorted(kwargs.items())))
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = get_session().client(
+                    service_name,
+                    endpoint_url=AWS_ENDPOINT_URL,
+                    region_name=AWS_REGION,
+                    config=get_client_config(),
+                    **kwargs
+                )
+                _clients[key] = instrument_client(client)
+    return client
+
 
 def get_dynamodb_resource():
-    return boto3.resource(
-        "dynamodb",
-        endpoint_url=AWS_ENDPOINT_URL,
-        region_name=AWS_REGION
+    """Return a DynamoDB resource; resources are not thread-safe, so there is one per thread."""
+    resource = getattr(_local, "dynamodb", None)
+    if resource is None:
+        with _lock:
+            resource = get_session().resource(
+                "dynamodb",
+                endpoint_url=AWS_ENDPOINT_URL,
+                region_name=AWS_REGION,
+                config=get_client_config(),
+            )
+            instrument_client(resource.meta.client)
+        _local.dynamodb = resource
+    return resource
+
+
+def get_queue_url(client, queue_name: str) -> str:
+    """Resolve (creating if needed) and cache the URL of an SQS queue per endpoint and region."""
+    # Клієнти з різними ендпоінтами (або фейкові) не мають ділити кеш
+    meta = getattr(client, "meta", None)
+    key = (getattr(meta, "endpoint_url", None), getattr(meta, "region_name", None), queue_name) if meta else None
+    queue_url = _queue_urls.get(key) if key else None
+    if queue_url is None:
+        try:
+            # Спробувати отримати існуючу чергу
+            queue_url = client.get_queue_url(QueueName=queue_name)["QueueUrl"]
+        except client.exceptions.QueueDoesNotExist:
+            # Якщо черга не існує, створити її
+            attributes = {"FifoQueue": "true"} if queue_name.endswith(".fifo") else {}
+            queue_url = client.create_queue(QueueName=queue_name, Attributes=attributes)["QueueUrl"]
+        if key:
+            _queue_urls[key] = queue_url
+    return queue_url
+
+
+def shipping_table_indexes() -> list[dict]:
+    """Global secondary indexes of the shipping table."""
+    return [
+        {
+            "IndexName": STATUS_DUE_DATE_INDEX,
+            "KeySchema": [
+                {"AttributeName": "shipping_status", "KeyType": "HASH"},
+                {"AttributeName": "due_at", "KeyType": "RANGE"},
+            ],
+            "Projection": {"ProjectionType": "ALL"},
+        },
+        {
+            "IndexName": ORDER_ID_INDEX,
+            "KeySchema": [{"AttributeName": "order_id", "KeyType": "HASH"}],
+            "Projection": {"ProjectionType": "ALL"},
+        },
+    ]
+
+
+def shipping_table_attributes() -> list[dict]:
+    return [
+        {"AttributeName": "shipping_id", "AttributeType": "S"},
+        {"AttributeName": "shipping_status", "AttributeType": "S"},
+        {"AttributeName": "due_at", "AttributeType": "N"},
+        {"AttributeName": "order_id", "AttributeType": "S"},
+    ]
+
+
+def wait_for_table_active(client, table_name: str, timeout: float = SHIPPING_TABLE_ACTIVE_TIMEOUT_SECONDS,
+                          delay: float = 1.0) -> None:
+    """Poll describe_table until the table and all its indexes are ACTIVE; raise TimeoutError otherwise."""
+    deadline = time.monotonic() + timeout
+    while True:
+        table = client.describe_table(TableName=table_name)["Table"]
+        pending = {
+            index["IndexName"]: index.get("IndexStatus")
+            for index in table.get("GlobalSecondaryIndexes", [])
+            if index.get("IndexStatus", "ACTIVE") != "ACTIVE"
+        }
+        if table["TableStatus"] == "ACTIVE" and not pending:
+            return
+        if time.monotonic() >= deadline:
+            raise TimeoutError(
+                f"Table {table_name} is not ACTIVE after {timeout:g}s "
+                f"(table: {table['TableStatus']}, indexes: {pending or 'ACTIVE'})"
+            )
+        time.sleep(delay)
+
+
+def create_shipping_table(client=None, table_name: str = SHIPPING_TABLE_NAME) -> None:
+    """Create the shipping table with its indexes, or add missing indexes to an existing table."""
+    client = client or get_client("dynamodb")
+    if table_name not in client.list_tables()["TableNames"]:
+        client.create_table(
+            TableName=table_name,
+            KeySchema=[{"AttributeName": "shipping_id", "KeyType": "HASH"}],
+            AttributeDefinitions=shipping_table_attributes(),
+            GlobalSecondaryIndexes=shipping_table_indexes(),
+            BillingMode="PAY_PER_REQUEST",
+        )
+        client.get_waiter("table_exists").wait(TableName=table_name)
+        return
+    existing = {
+        index["IndexName"]
+        for index in client.describe_table(TableName=table_name)["Table"].get("GlobalSecondaryIndexes", [])
+    }
+    # DynamoDB дозволяє створювати лише один індекс за виклик update_table, і наступний
+    # лише після того, як попередній стане ACTIVE; запити до індексу теж чекають на це
+    for index in shipping_table_indexes():
+        if index["IndexName"] not in existing:
+            wait_for_table_active(client, table_name)
+            client.update_table(
+                TableName=table_name,
+                AttributeDefinitions=shipping_table_attributes(),
+                GlobalSecondaryIndexUpdates=[{"Create": index}],
+            )
+    wait_for_table_active(client, table_name)
+
+
+def create_outbox_table(client=None, table_name: str = SHIPPING_OUTBOX_TABLE_NAME) -> None:
+    """Create the outbox table that holds shippings whose queue message is not sent yet."""
+    client = client or get_client("dynamodb")
+    if table_name in client.list_tables()["TableNames"]:
+        return
+    client.create_table(
+        TableName=table_name,
+        KeySchema=[{"AttributeName": "shipping_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "shipping_id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
     )
+    client.get_waiter("table_exists").wait(TableName=table_name)
+
+
+def reset_clients() -> None:
+    """Drop cached session, clients and queue URLs."""
+    global _session, _local  # pylint: disable=global-statement
+    with _lock:
+        _session = None
+        _clients.clear()
+        _queue_urls.clear()
+        _local = threading.local()
+
+
+def _reset_after_fork() -> None:
+    # Пули з'єднань не можна ділити між процесами, а лок міг бути захоплений іншим потоком
+    global _lock  # pylint: disable=global-statement
+    _lock = threading.RLock()
+    reset_clients()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
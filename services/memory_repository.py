@@ -0,0 +1,165 @@
+"""
+In-memory shipping storage for local runs, load tests and unit tests.
+"""
+
+import bisect
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+from .codec import decode_item, to_epoch
+from .repository import (
+    ShippingRepository,
+    build_shipping_item,
+    idempotent_shipping_id,
+    ok_response,
+    project_item,
+)
+
+
+class MemoryStore:
+    """Shipping items, their secondary indexes and the outbox, guarded by one lock."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.items: dict[str, dict] = {}
+        # status -> відсортований список (due_at, shipping_id), як індекс shipping_status-due_at
+        self.by_status: dict[str, list] = {}
+        self.by_order: dict[str, dict] = {}
+        self.outbox: dict[str, Decimal] = {}
+
+    def put(self, item: dict) -> None:
+        self.remove(item["shipping_id"])
+        self.items[item["shipping_id"]] = item
+        self._index(item)
+
+    def remove(self, shipping_id: str) -> None:
+        item = self.items.pop(shipping_id, None)
+        if item is None:
+            return
+        if "due_at" in item and "shipping_status" in item:
+            entries = self.by_status[item["shipping_status"]]
+            del entries[bisect.bisect_left(entries, (item["due_at"], shipping_id))]
+        if "order_id" in item:
+            self.by_order[item["order_id"]].pop(shipping_id, None)
+
+    def _index(self, item: dict) -> None:
+        # Як і GSI у DynamoDB, індекс містить лише елементи з обома ключовими атрибутами
+        if "due_at" in item and "shipping_status" in item:
+            bisect.insort(self.by_status.setdefault(item["shipping_status"], []), (item["due_at"], item["shipping_id"]))
+        if "order_id" in item:
+            self.by_order.setdefault(item["order_id"], {})[item["shipping_id"]] = None
+
+
+_default_store = MemoryStore()
+
+
+class InMemoryShippingRepository(ShippingRepository):
+    """Lock-protected shipping storage in process memory.
+
+    Repositories share one process-wide store unless they are given their own,
+    so separately constructed repositories see the same shippings, as they would
+    with a database.
+    """
+
+    def __init__(self, store: MemoryStore = None):
+        self.store = store or _default_store
+
+    def get_shipping(self, shipping_id, attributes: list = None):
+        with self.store.lock:
+            item = self.store.items.get(shipping_id)
+        # Збережені елементи не змінюються на місці, тож декодувати можна поза блокуванням
+        return project_item(decode_item(item), attributes) if item else None
+
+    def get_shippings(self, shipping_ids: list, attributes: list = None, consistent_read: bool = False) -> dict:
+        with self.store.lock:
+            items = {shipping_id: self.store.items[shipping_id] for shipping_id in shipping_ids
+                     if shipping_id in self.store.items}
+        return {shipping_id: project_item(decode_item(item), attributes) for shipping_id, item in items.items()}
+
+    def iter_shippings(self, status: str, due_before: datetime = None, due_after: datetime = None, page_size: int = 100):
+        with self.store.lock:
+            entries = self.store.by_status.get(status, [])
+            start = bisect.bisect_left(entries, (to_epoch(due_after),)) if due_after else 0
+            if due_before and due_after:
+                # Між двома межами включно, як BETWEEN у DynamoDB
+                end = bisect.bisect_right(entries, (to_epoch(due_before), "\U0010ffff"))
+            elif due_before:
+                end = bisect.bisect_left(entries, (to_epoch(due_before),))
+            else:
+                end = len(entries)
+            shipping_ids = [shipping_id for _, shipping_id in entries[start:end]]
+        return self._iter_items(shipping_ids)
+
+    def iter_by_order(self, order_id: str, page_size: int = 100):
+        with self.store.lock:
+            shipping_ids = list(self.store.by_order.get(order_id, ()))
+        return self._iter_items(shipping_ids)
+
+    def _iter_items(self, shipping_ids: list):
+        for shipping_id in shipping_ids:
+            item = self.get_shipping(shipping_id)
+            if item is not None:
+                yield item
+
+    def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime,
+                        outbox: bool = False):
+        item = build_shipping_item(shipping_type, product_ids, order_id, status, due_date)
+        with self.store.lock:
+            self.store.put(item)
+            if outbox:
+                self.store.outbox[item["shipping_id"]] = item["created_at"]
+        return item["shipping_id"]
+
+    def create_shipping_once(self, shipping_type: str, product_ids: list, order_id: str, status: str,
+                             due_date: datetime, idempotency_key: str, outbox: bool = False) -> tuple:
+        shipping_id = idempotent_shipping_id(order_id, idempotency_key)
+        item = build_shipping_item(shipping_type, product_ids, order_id, status, due_date, shipping_id)
+        item["idempotency_key"] = idempotency_key
+        with self.store.lock:
+            if shipping_id in self.store.items:
+                return shipping_id, False
+            self.store.put(item)
+            if outbox:
+                self.store.outbox[shipping_id] = item["created_at"]
+        return shipping_id, True
+
+    def create_shippings_bulk(self, shippings: list, status: str, outbox: bool = False) -> list[str]:
+        items = [
+            build_shipping_item(shipping_type, product_ids, order_id, status, due_date)
+            for shipping_type, product_ids, order_id, due_date in shippings
+        ]
+        with self.store.lock:
+            for item in items:
+                self.store.put(item)
+                if outbox:
+                    self.store.outbox[item["shipping_id"]] = item["created_at"]
+        return [item["shipping_id"] for item in items]
+
+    def update_shipping_status(self, shipping_id, status):
+        with self.store.lock:
+            # update_item у DynamoDB створює елемент, якого ще немає
+            item = dict(self.store.items.get(shipping_id) or {"shipping_id": shipping_id})
+            item["shipping_status"] = status
+            self.store.put(item)
+        return ok_response()
+
+    def finish_shipping(self, shipping_id, now: datetime, on_time_status: str, late_status: str, terminal_statuses: tuple):
+        with self.store.lock:
+            item = self.store.items.get(shipping_id)
+            if item is None or "due_at" not in item or item.get("shipping_status") in terminal_statuses:
+                return None
+            item = dict(item)
+            item["shipping_status"] = on_time_status if item["due_at"] >= to_epoch(now) else late_status
+            self.store.put(item)
+            return ok_response(Attributes={"shipping_status": item["shipping_status"]})
+
+    def iter_outbox(self, page_size: int = 100):
+        with self.store.lock:
+            shipping_ids = list(self.store.outbox)
+        return iter(shipping_ids)
+
+    def delete_outbox_entries(self, shipping_ids: list) -> None:
+        with self.store.lock:
+            for shipping_id in shipping_ids:
+                self.store.outbox.pop(shipping_id, None)
@@ -0,0 +1,233 @@
+"""
+Metrics for AWS calls and shipping service operations.
+
+Metrics go to a process-wide sink, which defaults to a no-op. Install an
+``InMemoryMetrics`` (or any object with ``increment``/``observe``) with
+``set_metrics()`` and expose it with ``serve_prometheus()``.
+"""
+
+import bisect
+import functools
+import threading
+import time
+
+THROTTLE_CODES = frozenset({
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "Throttling",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+})
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10)
+
+
+class NullMetrics:
+    """Sink that drops everything."""
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        pass
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        pass
+
+
+class InMemoryMetrics:
+    """Thread-safe counters and fixed-bucket histograms with Prometheus text export."""
+
+    def __init__(self, buckets: dict = None):
+        self.buckets = {"sqs_receive_batch_size": BATCH_SIZE_BUCKETS, **(buckets or {})}
+        self._lock = threading.Lock()
+        self._counters: dict = {}
+        # (name, labels) -> [лічильники по кошиках + нескінченність, сума, кількість]
+        self._histograms: dict = {}
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        buckets = self.buckets.get(name, LATENCY_BUCKETS)
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def counter(self, name: str, **labels) -> float:
+        """Return the current value of a counter."""
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def histogram_count(self, name: str, **labels) -> int:
+        """Return how many values a histogram has observed."""
+        histogram = self._histograms.get((name, tuple(sorted(labels.items()))))
+        return histogram[2] if histogram else 0
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(value[0]), value[1], value[2]) for key, value in self._histograms.items()}
+        lines = []
+        for name in sorted({key[0] for key in counters}):
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(
+                f"{name}{_labels(labels)} {value}"
+                for (metric, labels), value in sorted(counters.items()) if metric == name
+            )
+        for name in sorted({key[0] for key in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            buckets = self.buckets.get(name, LATENCY_BUCKETS)
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip((*buckets, "+Inf"), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {total}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+NULL_METRICS = NullMetrics()
+_metrics = NULL_METRICS
+
+
+def get_metrics():
+    return _metrics
+
+
+def set_metrics(sink) -> None:
+    """Install the process-wide metrics sink (None restores the no-op sink)."""
+    global _metrics  # pylint: disable=global-statement
+    _metrics = sink or NULL_METRICS
+
+
+def timed(method: str):
+    """Decorator recording latency, calls and errors of a ShippingService method."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            sink = _metrics
+            if sink is NULL_METRICS:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                sink.increment("shipping_service_errors_total", method=method)
+                raise
+            finally:
+                sink.observe("shipping_service_seconds", time.perf_counter() - started, method=method)
+        return wrapper
+    return decorator
+
+
+@functools.lru_cache(maxsize=None)
+def _operation_name(service_name: str, operation_name: str) -> tuple:
+    from botocore import xform_name  # pylint: disable=import-outside-toplevel
+    return service_name, xform_name(operation_name)
+
+
+def _operation(model) -> tuple:
+    return _operation_name(model.service_model.service_name, model.name)
+
+
+def _before_call(model, context, **kwargs) -> None:
+    if _metrics is not NULL_METRICS:
+        context["metrics_started"] = time.perf_counter()
+        # after-call-error не отримує model, тому операцію запам'ятовуємо тут
+        context["metrics_operation"] = _operation(model)
+
+
+def _after_call(model, parsed, context, **kwargs) -> None:
+    started = context.pop("metrics_started", None)
+    context.pop("metrics_operation", None)
+    sink = _metrics
+    if started is None or sink is NULL_METRICS:
+        return
+    service, operation = _operation(model)
+    sink.observe("aws_call_seconds", time.perf_counter() - started, service=service, operation=operation)
+    sink.increment("aws_calls_total", service=service, operation=operation)
+    code = parsed.get("Error", {}).get("Code")
+    if code:
+        sink.increment("aws_call_errors_total", service=service, operation=operation, code=code)
+    elif operation == "receive_message":
+        received = len(parsed.get("Messages", []))
+        sink.observe("sqs_receive_batch_size", received)
+        if not received:
+            sink.increment("sqs_empty_receives_total")
+
+
+def _after_call_error(exception, context, **kwargs) -> None:
+    started = context.pop("metrics_started", None)
+    service_operation = context.pop("metrics_operation", None)
+    sink = _metrics
+    if started is None or service_operation is None or sink is NULL_METRICS:
+        return
+    service, operation = service_operation
+    sink.observe("aws_call_seconds", time.perf_counter() - started, service=service, operation=operation)
+    sink.increment("aws_calls_total", service=service, operation=operation)
+    sink.increment("aws_call_errors_total", service=service, operation=operation, code=type(exception).__name__)
+
+
+def _needs_retry(response, operation, **kwargs) -> None:
+    # Викликається на кожну спробу, тому бачить і тротлінг, який botocore сам повторив
+    sink = _metrics
+    if sink is NULL_METRICS or not response:
+        return
+    code = response[1].get("Error", {}).get("Code")
+    if code in THROTTLE_CODES:
+        service, name = _operation(operation)
+        sink.increment("aws_throttles_total", service=service, operation=name)
+
+
+def instrument_client(client):
+    """Record latency, calls, errors and throttles of every call made by a botocore client."""
+    events = client.meta.events
+    events.register("before-call", _before_call, unique_id="shipping-metrics-before-call")
+    events.register("after-call", _after_call, unique_id="shipping-metrics-after-call")
+    events.register("after-call-error", _after_call_error, unique_id="shipping-metrics-after-call-error")
+    events.register("needs-retry", _needs_retry, unique_id="shipping-metrics-needs-retry")
+    return client
+
+
+def serve_prometheus(port: int, sink: InMemoryMetrics = None, host: str = "0.0.0.0") -> "ThreadingHTTPServer":
+    """Serve the metrics in Prometheus text format from a background thread."""
+    # http.server імпортується лише тут: він помітно сповільнює старт процесу
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # pylint: disable=import-outside-toplevel
+
+    if sink is None:
+        sink = _metrics if isinstance(_metrics, InMemoryMetrics) else InMemoryMetrics()
+        set_metrics(sink)
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # pylint: disable=invalid-name
+            body = sink.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="shipping-metrics", daemon=True).start()
+    return server
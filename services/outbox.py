@@ -0,0 +1,106 @@
+"""
+Relay that publishes shippings written in outbox mode to the shipping queue.
+
+Run it with ``python -m services.outbox``.
+"""
+
+import argparse
+import logging
+import signal
+import threading
+
+from .config import SHIPPING_OUTBOX_RELAY_INTERVAL_SECONDS
+from .publisher import ShippingPublisher
+from .repository import ShippingRepository
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """Send pending outbox entries in batches and remove their markers once sent.
+
+    Delivery is at-least-once: a crash between sending and removing the marker
+    sends the message again, which the worker acknowledges as already processed.
+    """
+
+    def __init__(self, repository: ShippingRepository, publisher: ShippingPublisher,
+                 interval_seconds: float = SHIPPING_OUTBOX_RELAY_INTERVAL_SECONDS, max_per_run: int = 1000):
+        """Initialize the relay with its repository and publisher."""
+        self.repository = repository
+        self.publisher = publisher
+        self.interval_seconds = interval_seconds
+        self.max_per_run = max_per_run
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> 'OutboxRelay':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def run_once(self) -> int:
+        """Publish up to max_per_run pending entries and return how many were sent."""
+        sent = 0
+        batch = []
+        for shipping_id in self.repository.iter_outbox():
+            batch.append(shipping_id)
+            if len(batch) == self.publisher.MAX_BATCH_SIZE:
+                sent += self._send(batch)
+                batch = []
+            if sent + len(batch) >= self.max_per_run:
+                break
+        if batch:
+            sent += self._send(batch)
+        self.sent += sent
+        return sent
+
+    def run(self) -> None:
+        """Relay entries until stop() is called; runs again right away while there is a backlog."""
+        while not self._stop.is_set():
+            try:
+                sent = self.run_once()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Outbox relay run failed")
+                sent = 0
+            if sent < self.max_per_run:
+                self._stop.wait(self.interval_seconds)
+
+    def start(self) -> None:
+        """Run the relay in a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="shipping-outbox-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread after its current run."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _send(self, batch: list[str]) -> int:
+        failed = set(self.publisher.send_shippings_batch(batch))
+        sent = [shipping_id for shipping_id in batch if shipping_id not in failed]
+        if sent:
+            self.repository.delete_outbox_entries(sent)
+        return len(sent)
+
+
+def main(argv: list[str] = None) -> None:
+    """Command line entry point for the outbox relay."""
+    parser = argparse.ArgumentParser(description="Publish pending outbox entries to the shipping queue.")
+    parser.add_argument("--interval", type=float, default=SHIPPING_OUTBOX_RELAY_INTERVAL_SECONDS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    relay = OutboxRelay(ShippingRepository(), ShippingPublisher(), interval_seconds=args.interval)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: relay.stop())
+    relay.run()
+
+
+if __name__ == "__main__":
+    main()
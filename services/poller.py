@@ -0,0 +1,103 @@
+"""
+Adaptive receiver for the shipping queue.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from .publisher import ShippingPublisher
+
+
+class ReceivedShipping(NamedTuple):
+    """A received queue message reduced to what is needed to process and acknowledge it."""
+
+    shipping_id: str
+    receipt_handle: str
+    receive_count: int
+
+
+class AdaptivePoller:
+    """Receive shipping messages with a wait time and fan-out that follow the traffic.
+
+    Empty receives double the long-poll wait (up to ``max_wait_time_seconds``) so
+    an idle queue costs few requests; non-empty receives halve it, so a consumer
+    that just saw traffic returns quickly with whatever is available. The batch
+    size is capped by the free capacity the caller reports, and while recent
+    receives come back full and there is room for several batches, up to
+    ``max_parallel_receives`` receive calls run at once.
+    """
+
+    FULL_BATCH_RATIO: float = 0.9
+    SMOOTHING: float = 0.3
+
+    def __init__(
+        self,
+        publisher: ShippingPublisher,
+        max_wait_time_seconds: int = 20,
+        max_parallel_receives: int = 4,
+        visibility_timeout: int = None,
+    ):
+        """Initialize the poller for the given publisher's queue."""
+        self.publisher = publisher
+        self.max_wait_time_seconds = max_wait_time_seconds
+        self.max_parallel_receives = max_parallel_receives
+        self.visibility_timeout = visibility_timeout
+        self.wait_time_seconds = max_wait_time_seconds
+        # Згладжена частка заповнення останніх батчів, від 0 до 1
+        self.fullness = 0.0
+        self._pool = None
+
+    def __enter__(self) -> 'AdaptivePoller':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def parallel_receives(self, capacity: int) -> int:
+        """Return how many receive calls to run for the given free capacity."""
+        if self.fullness < self.FULL_BATCH_RATIO:
+            return 1
+        return max(1, min(self.max_parallel_receives, capacity // ShippingPublisher.MAX_BATCH_SIZE))
+
+    def poll(self, capacity: int = ShippingPublisher.MAX_BATCH_SIZE) -> list[ReceivedShipping]:
+        """Receive up to ``capacity`` messages."""
+        if capacity <= 0:
+            return []
+        receives = self.parallel_receives(capacity)
+        batch_size = min(ShippingPublisher.MAX_BATCH_SIZE, -(-capacity // receives))
+        if receives == 1:
+            batches = [self._receive(batch_size)]
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.max_parallel_receives, thread_name_prefix="shipping-poller")
+            batches = list(self._pool.map(self._receive, [batch_size] * receives))
+
+        received = [message for batch in batches for message in batch]
+        self.fullness += self.SMOOTHING * (len(received) / (batch_size * receives) - self.fullness)
+        if received:
+            self.wait_time_seconds //= 2
+        else:
+            self.wait_time_seconds = min(self.max_wait_time_seconds, max(1, self.wait_time_seconds * 2))
+        return received
+
+    def close(self) -> None:
+        """Stop the threads used for parallel receives."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _receive(self, batch_size: int) -> list[ReceivedShipping]:
+        messages = self.publisher.receive_shipping_messages(
+            batch_size=batch_size,
+            wait_time_seconds=self.wait_time_seconds,
+            visibility_timeout=self.visibility_timeout,
+            attribute_names=["ApproximateReceiveCount"],
+        )
+        return [
+            ReceivedShipping(
+                message["Body"],
+                message["ReceiptHandle"],
+                int(message.get("Attributes", {}).get("ApproximateReceiveCount", 1)),
+            )
+            for message in messages
+        ]
@@ -1,43 +1,273 @@
-import boto3
-from .config import AWS_ENDPOINT_URL, AWS_REGION, SHIPPING_QUEUE
+import logging
+import threading
+import time
+from functools import cached_property
+
+from .config import (
+    SHIPPING_QUEUE,
+    SHIPPING_DEAD_LETTER_QUEUE,
+    SHIPPING_PUBLISH_BATCH_SIZE,
+    SHIPPING_PUBLISH_LINGER_SECONDS,
+    SHIPPING_PUBLISH_MAX_RETRIES,
+)
+from .db import get_client, get_queue_url
+from .resilience import Resilience, backoff_delay, get_resilience
+
+logger = logging.getLogger(__name__)
+
 
 class ShippingPublisher:
     """Publisher for sending shipping messages to SQS queue."""
 
-    def __init__(self):
-        """Initialize SQS client and get queue URL."""
-        self.client = boto3.client(
-            "sqs",
-            endpoint_url=AWS_ENDPOINT_URL,
-            region_name=AWS_REGION,
-            aws_access_key_id="test",
-            aws_secret_access_key="test",
-        )
-        try:
-            # Спробувати отримати існуючу чергу
-            response = self.client.get_queue_url(QueueName=SHIPPING_QUEUE)
-            self.queue_url = response["QueueUrl"]
-        except self.client.exceptions.QueueDoesNotExist:
-            # Якщо черга не існує, створити її
-            response = self.client.create_queue(QueueName=SHIPPING_QUEUE)
-            self.queue_url = response["QueueUrl"]
-
-    def send_new_shipping(self, shipping_id: str) -> str:
-        """Send a new shipping ID to the SQS queue."""
-        response = self.client.send_message(
+    MAX_BATCH_SIZE: int = 10
+    MAX_DELAY_SECONDS: int = 900
+
+    def __init__(self, client=None, resilience: Resilience = None):
+        """Initialize the publisher; the SQS client and queue URL are resolved on first use."""
+        if client is not None:
+            self.client = client
+        self.resilience = resilience or get_resilience()
+        self.fifo = SHIPPING_QUEUE.endswith(".fifo")
+
+    @cached_property
+    def client(self):
+        return get_client("sqs", aws_access_key_id="test", aws_secret_access_key="test")
+
+    @cached_property
+    def queue_url(self) -> str:
+        return self.resilience.call("sqs.get_queue_url", get_queue_url, self.client, SHIPPING_QUEUE)
+
+    @cached_property
+    def dead_letter_queue_url(self) -> str:
+        return self.resilience.call("sqs.get_queue_url", get_queue_url, self.client, SHIPPING_DEAD_LETTER_QUEUE)
+
+    def warm_up(self, background: bool = False):
+        """Create the client and resolve the queue URL now; optionally in a background thread."""
+        if background:
+            thread = threading.Thread(target=self.warm_up, name="shipping-publisher-warm-up", daemon=True)
+            thread.start()
+            return thread
+        return self.queue_url
+
+    def _call(self, operation: str, **kwargs):
+        return self.resilience.call(f"sqs.{operation}", getattr(self.client, operation), **kwargs)
+
+    def _message(self, shipping_id: str) -> dict:
+        message = {"MessageBody": shipping_id}
+        if self.fifo:
+            # Повторна відправка того самого shipping_id відсіюється чергою протягом 5 хвилин
+            message["MessageDeduplicationId"] = shipping_id
+            message["MessageGroupId"] = shipping_id
+        return message
+
+    def send_new_shipping(self, shipping_id: str, delay_seconds: float = 0) -> str:
+        """Send a new shipping ID to the SQS queue.
+
+        ``delay_seconds`` (capped at 15 minutes) hides the message until then;
+        FIFO queues do not support per-message delays, so it is ignored there.
+        """
+        message = self._message(shipping_id)
+        if delay_seconds > 0 and not self.fifo:
+            message["DelaySeconds"] = min(int(delay_seconds), self.MAX_DELAY_SECONDS)
+        response = self._call(
+            "send_message",
             QueueUrl=self.queue_url,
-            MessageBody=shipping_id
+            **message
         )
         return response['MessageId']
 
-    def poll_shipping(self, batch_size: int = 10) -> list[str]:
+    def send_shippings_batch(self, shipping_ids: list[str]) -> list[str]:
+        """Send up to MAX_BATCH_SIZE shipping IDs in one call and return the IDs that failed."""
+        if not shipping_ids:
+            return []
+        if len(shipping_ids) > self.MAX_BATCH_SIZE:
+            raise ValueError(f"At most {self.MAX_BATCH_SIZE} messages can be sent in one batch")
+        # Id запису має бути унікальним лише в межах батчу, тому достатньо індексу
+        response = self._call(
+            "send_message_batch",
+            QueueUrl=self.queue_url,
+            Entries=[
+                {"Id": str(index), **self._message(shipping_id)}
+                for index, shipping_id in enumerate(shipping_ids)
+            ]
+        )
+        return [shipping_ids[int(entry["Id"])] for entry in response.get("Failed", [])]
+
+    def poll_shipping(self, batch_size: int = 10, wait_time_seconds: int = 10) -> list[str]:
         """Poll messages from the SQS queue."""
-        messages = self.client.receive_message(
+        # Атрибути повідомлень не використовуються, тому не запитуємо їх
+        messages = self._call(
+            "receive_message",
             QueueUrl=self.queue_url,
-            MessageAttributeNames=['All'],
             MaxNumberOfMessages=batch_size,
-            WaitTimeSeconds=10
+            WaitTimeSeconds=wait_time_seconds
         )
         if 'Messages' not in messages:
             return []
-        return [msg['Body'] for msg in messages['Messages']]
\ No newline at end of file
+        return [msg['Body'] for msg in messages['Messages']]
+
+    def receive_shipping_messages(
+        self, batch_size: int = 10, wait_time_seconds: int = 10, visibility_timeout: int = None,
+        attribute_names: list[str] = None
+    ) -> list[dict]:
+        """Receive raw queue messages, including receipt handles needed to acknowledge them."""
+        params = {
+            "QueueUrl": self.queue_url,
+            "MaxNumberOfMessages": batch_size,
+            "WaitTimeSeconds": wait_time_seconds,
+        }
+        if visibility_timeout is not None:
+            params["VisibilityTimeout"] = visibility_timeout
+        if attribute_names:
+            params["AttributeNames"] = attribute_names
+        return self._call("receive_message", **params).get("Messages", [])
+
+    def delete_shippings(self, receipt_handles: list[str]) -> list[str]:
+        """Delete processed messages with delete_message_batch and return handles that failed."""
+        failed = []
+        for start in range(0, len(receipt_handles), self.MAX_BATCH_SIZE):
+            chunk = receipt_handles[start:start + self.MAX_BATCH_SIZE]
+            response = self._call(
+                "delete_message_batch",
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {"Id": str(index), "ReceiptHandle": handle}
+                    for index, handle in enumerate(chunk)
+                ]
+            )
+            failed.extend(chunk[int(entry["Id"])] for entry in response.get("Failed", []))
+        return failed
+
+    def send_to_dead_letter_queue(self, shipping_id: str, receipt_handle: str) -> None:
+        """Copy a message that keeps failing to the dead-letter queue, then delete it from the shipping queue."""
+        self._call("send_message", QueueUrl=self.dead_letter_queue_url, **self._message(shipping_id))
+        self._call("delete_message", QueueUrl=self.queue_url, ReceiptHandle=receipt_handle)
+
+    def extend_visibility(self, receipt_handle: str, visibility_timeout: int) -> None:
+        """Keep a message hidden from other consumers while it is still being processed."""
+        self._call(
+            "change_message_visibility",
+            QueueUrl=self.queue_url,
+            ReceiptHandle=receipt_handle,
+            VisibilityTimeout=visibility_timeout
+        )
+
+
+class BufferedShippingPublisher(ShippingPublisher):
+    """Publisher that buffers shipping IDs and sends them with send_message_batch.
+
+    Messages are flushed by a background thread once a full batch is collected
+    or the oldest buffered message has waited ``linger_seconds``. Use ``flush()``
+    to send everything synchronously and ``close()`` (or a ``with`` block) to
+    flush and stop the background thread.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = SHIPPING_PUBLISH_BATCH_SIZE,
+        linger_seconds: float = SHIPPING_PUBLISH_LINGER_SECONDS,
+        max_retries: int = SHIPPING_PUBLISH_MAX_RETRIES,
+        client=None,
+        resilience: Resilience = None,
+    ):
+        """Initialize the publisher and its send buffer."""
+        super().__init__(client, resilience)
+        if not 1 <= batch_size <= self.MAX_BATCH_SIZE:
+            raise ValueError(f"Batch size must be between 1 and {self.MAX_BATCH_SIZE}")
+        self.batch_size = batch_size
+        self.linger_seconds = linger_seconds
+        self.max_retries = max_retries
+        self.failed_shipping_ids: list[str] = []
+        self._buffer: list[str] = []
+        self._oldest_at = 0.0
+        self._condition = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+
+    def __enter__(self) -> 'BufferedShippingPublisher':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def send_new_shipping(self, shipping_id: str, delay_seconds: float = 0) -> None:
+        """Buffer a shipping ID; it is sent with the next batch.
+
+        Delayed messages are sent right away, bypassing the buffer.
+        """
+        if delay_seconds > 0:
+            super().send_new_shipping(shipping_id, delay_seconds)
+            return
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Publisher is closed")
+            if not self._buffer:
+                self._oldest_at = time.monotonic()
+            self._buffer.append(shipping_id)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="shipping-publisher-flush", daemon=True
+                )
+                self._thread.start()
+            # Будимо потік для першого повідомлення (старт таймера) і для повного батчу
+            if len(self._buffer) == 1 or len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def flush(self) -> list[str]:
+        """Send all buffered shipping IDs and return the ones that could not be sent."""
+        with self._condition:
+            pending, self._buffer = self._buffer, []
+        failed = []
+        for start in range(0, len(pending), self.batch_size):
+            failed.extend(self._send_with_retry(pending[start:start + self.batch_size]))
+        return failed
+
+    def close(self) -> list[str]:
+        """Flush the buffer and stop the background thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        return self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed and not self._batch_ready():
+                    timeout = None
+                    if self._buffer:
+                        timeout = max(0.0, self._oldest_at + self.linger_seconds - time.monotonic())
+                    self._condition.wait(timeout)
+                if self._closed:
+                    return
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                if self._buffer:
+                    self._oldest_at = time.monotonic()
+            self._send_with_retry(batch)
+
+    def _batch_ready(self) -> bool:
+        if not self._buffer:
+            return False
+        if len(self._buffer) >= self.batch_size:
+            return True
+        return time.monotonic() - self._oldest_at >= self.linger_seconds
+
+    def _send_with_retry(self, batch: list[str]) -> list[str]:
+        attempt = 0
+        with self._send_lock:
+            while batch:
+                try:
+                    batch = self.send_shippings_batch(batch)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Failed to send batch of %d shipping messages", len(batch))
+                if not batch or attempt >= self.max_retries:
+                    break
+                attempt += 1
+                time.sleep(backoff_delay(attempt))
+            if batch:
+                logger.error("Giving up on %d shipping messages", len(batch))
+                self.failed_shipping_ids.extend(batch)
+        return batch
@@ -1,38 +1,421 @@
-from .config import SHIPPING_TABLE_NAME
-from .db import get_dynamodb_resource
+from .codec import decode_item, encode_item, stored_attributes, to_epoch, upgrade_item
+from .config import SHIPPING_BACKEND, SHIPPING_TABLE_NAME, SHIPPING_OUTBOX_TABLE_NAME
+from .db import get_dynamodb_resource, STATUS_DUE_DATE_INDEX, ORDER_ID_INDEX
+from .metrics import get_metrics
+from .resilience import Resilience, backoff_delay, get_resilience
 
-from uuid import uuid4
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import cached_property
+from importlib import import_module
+from uuid import NAMESPACE_URL, uuid4, uuid5
 from datetime import datetime, timezone
 
 
-class ShippingRepository:
+class UnprocessedKeysError(RuntimeError):
+    """Raised when batch_get_item keeps returning unprocessed keys after all retries.
 
+    ``shippings`` holds what was fetched, keyed by shipping_id, and
+    ``unprocessed_ids`` the shippings that could not be read.
+    """
 
-    def __init__(self):
-        dynamo_resource = get_dynamodb_resource()
-        self.table = dynamo_resource.Table(SHIPPING_TABLE_NAME)
+    def __init__(self, shippings: dict, unprocessed_ids: list):
+        super().__init__(f"{len(unprocessed_ids)} shippings were not read after retries")
+        self.shippings = shippings
+        self.unprocessed_ids = unprocessed_ids
 
 
-    def get_shipping(self, shipping_id):
-        response = self.table.get_item(Key={"shipping_id": shipping_id})
-        return response.get("Item")
+def _to_iso(value: datetime) -> str:
+    # Формат дат елементів версії 1, рядки сортуються так само, як дати
+    value = value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    return value.isoformat(timespec="microseconds")
 
-    def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime):
-        shipping_id = str(uuid4())
-        item = {
-            "shipping_id": shipping_id,
-            "shipping_type": shipping_type,
-            "order_id": order_id,
-            "product_ids": ",".join(product_ids),
-            "shipping_status": status,
-            "created_date": datetime.now(timezone.utc).isoformat(),
-            "due_date": due_date.replace(tzinfo=timezone.utc).isoformat()
+
+def idempotent_shipping_id(order_id: str, idempotency_key: str) -> str:
+    """Derive a stable shipping ID from an order and a client-supplied idempotency key."""
+    return str(uuid5(NAMESPACE_URL, f"shipping:{order_id}:{idempotency_key}"))
+
+
+def build_shipping_item(shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime,
+                        shipping_id: str = None) -> dict:
+    return encode_item(shipping_id or str(uuid4()), shipping_type, product_ids, order_id, status, due_date)
+
+
+def finish_shipping_updates(now: datetime, on_time_status: str, late_status: str, terminal_statuses: tuple) -> list[dict]:
+    """Build the conditional update_item arguments used to finish a shipping.
+
+    The first update applies when the shipping is not yet due, the second when it
+    is overdue; both refuse to touch shippings already in a terminal state. The
+    due date is compared in both item versions (due_at or the ISO due_date); a
+    missing attribute makes its comparison false. Only the new status is returned.
+    """
+    terminal_values = {f":terminal{i}": status for i, status in enumerate(terminal_statuses)}
+    not_terminal = f"NOT shipping_status IN ({', '.join(terminal_values)})"
+    values = {":now": to_epoch(now), ":now_iso": _to_iso(now), **terminal_values}
+    return [
+        {
+            "UpdateExpression": "SET shipping_status = :sh_status",
+            "ConditionExpression": (
+                f"(due_at {comparison} :now OR due_date {comparison} :now_iso) AND {not_terminal}"
+            ),
+            "ExpressionAttributeValues": {":sh_status": status, **values},
+            "ReturnValues": "UPDATED_NEW",
+        }
+        for status, comparison in ((on_time_status, ">="), (late_status, "<"))
+    ]
+
+
+def projection(attributes: list) -> dict:
+    """Build ProjectionExpression arguments fetching shipping_id and ``attributes`` in any item version."""
+    names = {f"#a{i}": name for i, name in enumerate(stored_attributes(["shipping_id", *attributes]))}
+    return {"ProjectionExpression": ", ".join(names), "ExpressionAttributeNames": names}
+
+
+def ok_response(**fields) -> dict:
+    """Wrap a result the way DynamoDB responses look to ShippingService."""
+    return {**fields, "ResponseMetadata": {"HTTPStatusCode": 200}}
+
+
+def project_item(item: dict, attributes: list = None) -> dict:
+    """Copy an item, keeping only shipping_id and ``attributes`` when they are given."""
+    if not attributes:
+        return dict(item)
+    keep = {"shipping_id", *attributes}
+    return {key: value for key, value in item.items() if key in keep}
+
+
+# Назва бекенду -> (модуль, клас); модулі імпортуються лише коли бекенд обрано
+BACKENDS = {
+    "dynamodb": (".repository", "DynamoDBShippingRepository"),
+    "memory": (".memory_repository", "InMemoryShippingRepository"),
+    "sqlite": (".sqlite_repository", "SQLiteShippingRepository"),
+}
+
+
+def get_backend(name: str) -> type:
+    """Return the repository class registered under ``name``."""
+    try:
+        module, class_name = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown shipping backend {name!r}, expected one of {', '.join(BACKENDS)}") from None
+    return getattr(import_module(module, __package__), class_name)
+
+
+class ShippingRepository(ABC):
+    """Storage of shippings.
+
+    ``ShippingRepository()`` returns an instance of the backend selected by
+    SHIPPING_BACKEND; backends subclass this class and implement its abstract
+    methods, so an incomplete backend fails when it is constructed. Items are
+    dicts shaped like the DynamoDB items (see build_shipping_item), and write
+    methods return DynamoDB-like responses.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        if cls is ShippingRepository:
+            cls = get_backend(SHIPPING_BACKEND)
+        return super().__new__(cls)
+
+    @abstractmethod
+    def get_shipping(self, shipping_id, attributes: list = None):
+        """Return a decoded shipping item, or None if it does not exist.
+
+        ``attributes`` limits the returned attributes (shipping_id is always included).
+        """
+
+    @abstractmethod
+    def get_shippings(self, shipping_ids: list, attributes: list = None, consistent_read: bool = False) -> dict:
+        """Return existing shippings keyed by shipping_id."""
+
+    @abstractmethod
+    def iter_shippings(self, status: str, due_before: datetime = None, due_after: datetime = None, page_size: int = 100):
+        """Lazily yield shippings with the given status in due_date order.
+
+        ``due_before`` is exclusive; with both bounds the range is inclusive, like BETWEEN.
+        Version 1 items are not indexed by due date until they are upgraded.
+        """
+
+    @abstractmethod
+    def iter_by_order(self, order_id: str, page_size: int = 100):
+        """Lazily yield all shippings of an order."""
+
+    @abstractmethod
+    def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime,
+                        outbox: bool = False):
+        """Store a new shipping and return its ID; with ``outbox`` also write an outbox marker atomically."""
+
+    @abstractmethod
+    def create_shipping_once(self, shipping_type: str, product_ids: list, order_id: str, status: str,
+                             due_date: datetime, idempotency_key: str, outbox: bool = False) -> tuple:
+        """Create a shipping keyed by (order_id, idempotency_key) unless it exists; return (shipping_id, created)."""
+
+    @abstractmethod
+    def create_shippings_bulk(self, shippings: list, status: str, outbox: bool = False) -> list[str]:
+        """Create (shipping_type, product_ids, order_id, due_date) shippings and return their IDs in input order.
+
+        With ``outbox`` every shipping is written atomically with its outbox marker.
+        """
+
+    @abstractmethod
+    def update_shipping_status(self, shipping_id, status):
+        """Set the status of a shipping unconditionally."""
+
+    @abstractmethod
+    def finish_shipping(self, shipping_id, now: datetime, on_time_status: str, late_status: str, terminal_statuses: tuple):
+        """Set the final status by due date; return the response with the new status in Attributes, or None."""
+
+    @abstractmethod
+    def iter_outbox(self, page_size: int = 100):
+        """Lazily yield IDs of shippings whose queue message has not been sent yet."""
+
+    @abstractmethod
+    def delete_outbox_entries(self, shipping_ids: list) -> None:
+        """Remove the outbox markers of sent shippings."""
+
+    def warm_up(self, background: bool = False):
+        """Open connections ahead of the first call; backends without a connection do nothing."""
+        return None
+
+
+class DynamoDBShippingRepository(ShippingRepository):
+    """Shipping storage in DynamoDB."""
+
+    BATCH_GET_SIZE: int = 100
+    # transact_write_items приймає до 100 дій, по дві на доставку
+    TRANSACT_CHUNK_SIZE: int = 50
+
+    def __init__(self, resilience: Resilience = None):
+        self.resilience = resilience or get_resilience()
+
+    # Ресурс і таблиці створюються під час першого звернення, а не в конструкторі
+    @cached_property
+    def dynamo_resource(self):
+        return get_dynamodb_resource()
+
+    @cached_property
+    def table(self):
+        return self.dynamo_resource.Table(SHIPPING_TABLE_NAME)
+
+    @cached_property
+    def outbox_table(self):
+        return self.dynamo_resource.Table(SHIPPING_OUTBOX_TABLE_NAME)
+
+    def warm_up(self, background: bool = False):
+        """Create the DynamoDB resource now instead of on first use; optionally in a background thread."""
+        if background:
+            thread = threading.Thread(target=self.warm_up, name="shipping-repository-warm-up", daemon=True)
+            thread.start()
+            return thread
+        return self.table, self.outbox_table
+
+    def _call(self, operation: str, function, **kwargs):
+        return self.resilience.call(f"dynamodb.{operation}", function, **kwargs)
+
+    def get_shipping(self, shipping_id, attributes: list = None):
+        request = projection(attributes) if attributes else {}
+        response = self._call("get_item", self.table.get_item, Key={"shipping_id": shipping_id}, **request)
+        return decode_item(response.get("Item"))
+
+    def get_shippings(self, shipping_ids: list, attributes: list = None, consistent_read: bool = False) -> dict:
+        """Fetch many shippings with batch_get_item and return them keyed by shipping_id.
+
+        Missing shippings are left out of the result. ``attributes`` limits the
+        fetched attributes (shipping_id is always included). Unprocessed keys
+        are retried like other throttled calls, up to the resilience policy's
+        attempts and retry budget; then UnprocessedKeysError is raised.
+        """
+        request = {"ConsistentRead": consistent_read}
+        if attributes:
+            request.update(projection(attributes))
+
+        shippings = {}
+        # batch_get_item не приймає дублікатів ключів
+        unique_ids = list(dict.fromkeys(shipping_ids))
+        for start in range(0, len(unique_ids), self.BATCH_GET_SIZE):
+            keys = [{"shipping_id": shipping_id} for shipping_id in unique_ids[start:start + self.BATCH_GET_SIZE]]
+            request_items = {self.table.name: {**request, "Keys": keys}}
+            attempt = 1
+            while request_items:
+                response = self._call("batch_get_item", self.dynamo_resource.batch_get_item, RequestItems=request_items)
+                for item in response["Responses"].get(self.table.name, []):
+                    shippings[item["shipping_id"]] = decode_item(item)
+                request_items = response.get("UnprocessedKeys")
+                if not request_items:
+                    break
+                if attempt >= self.resilience.max_attempts or not self.resilience.budget.acquire():
+                    unprocessed = [key["shipping_id"] for key in request_items[self.table.name]["Keys"]]
+                    unprocessed += unique_ids[start + self.BATCH_GET_SIZE:]
+                    raise UnprocessedKeysError(shippings, unprocessed)
+                get_metrics().increment("retries_total", operation="dynamodb.batch_get_item")
+                time.sleep(backoff_delay(attempt, self.resilience.base_delay, self.resilience.max_delay))
+                attempt += 1
+        return shippings
+
+    def iter_shippings(self, status: str, due_before: datetime = None, due_after: datetime = None, page_size: int = 100):
+        """Lazily yield shippings with the given status in due_date order, one query page at a time."""
+        from boto3.dynamodb.conditions import Key  # pylint: disable=import-outside-toplevel
+        condition = Key("shipping_status").eq(status)
+        if due_before and due_after:
+            condition &= Key("due_at").between(to_epoch(due_after), to_epoch(due_before))
+        elif due_before:
+            condition &= Key("due_at").lt(to_epoch(due_before))
+        elif due_after:
+            condition &= Key("due_at").gte(to_epoch(due_after))
+        return self._query_pages(IndexName=STATUS_DUE_DATE_INDEX, KeyConditionExpression=condition, Limit=page_size)
+
+    def iter_by_order(self, order_id: str, page_size: int = 100):
+        """Lazily yield all shippings of an order."""
+        from boto3.dynamodb.conditions import Key  # pylint: disable=import-outside-toplevel
+        return self._query_pages(IndexName=ORDER_ID_INDEX, KeyConditionExpression=Key("order_id").eq(order_id), Limit=page_size)
+
+    def _query_pages(self, **kwargs):
+        while True:
+            response = self._call("query", self.table.query, **kwargs)
+            yield from map(decode_item, response["Items"])
+            if "LastEvaluatedKey" not in response:
+                return
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime,
+                        outbox: bool = False):
+        """Store a new shipping; with ``outbox`` an outbox marker is written in the same transaction."""
+        item = build_shipping_item(shipping_type, product_ids, order_id, status, due_date)
+        if not outbox:
+            self._call("put_item", self.table.put_item, Item=item)
+            return item["shipping_id"]
+        # Токен робить повтор транзакції після втраченої відповіді ідемпотентним
+        self._call("transact_write_items", self.dynamo_resource.meta.client.transact_write_items, TransactItems=[
+            {"Put": {"TableName": self.table.name, "Item": item}},
+            {"Put": {
+                "TableName": self.outbox_table.name,
+                "Item": {"shipping_id": item["shipping_id"], "created_at": item["created_at"]},
+            }},
+        ], ClientRequestToken=item["shipping_id"])
+        return item["shipping_id"]
+
+    def create_shipping_once(self, shipping_type: str, product_ids: list, order_id: str, status: str,
+                             due_date: datetime, idempotency_key: str, outbox: bool = False) -> tuple:
+        """Create a shipping keyed by (order_id, idempotency_key) unless it already exists.
+
+        Returns (shipping_id, created); on replay the existing shipping ID is returned
+        with created=False and nothing is written.
+        """
+        shipping_id = idempotent_shipping_id(order_id, idempotency_key)
+        item = build_shipping_item(shipping_type, product_ids, order_id, status, due_date, shipping_id)
+        item["idempotency_key"] = idempotency_key
+        client = self.dynamo_resource.meta.client
+        try:
+            if not outbox:
+                self._call("put_item", self.table.put_item,
+                           Item=item, ConditionExpression="attribute_not_exists(shipping_id)")
+            else:
+                self._call("transact_write_items", client.transact_write_items, TransactItems=[
+                    {"Put": {
+                        "TableName": self.table.name,
+                        "Item": item,
+                        "ConditionExpression": "attribute_not_exists(shipping_id)",
+                    }},
+                    {"Put": {
+                        "TableName": self.outbox_table.name,
+                        "Item": {"shipping_id": shipping_id, "created_at": item["created_at"]},
+                    }},
+                ])
+        except client.exceptions.ConditionalCheckFailedException:
+            return shipping_id, False
+        except client.exceptions.TransactionCanceledException as error:
+            reasons = error.response.get("CancellationReasons", [])
+            if not reasons or reasons[0].get("Code") != "ConditionalCheckFailed":
+                raise
+            return shipping_id, False
+        return shipping_id, True
+
+    def iter_outbox(self, page_size: int = 100):
+        """Lazily yield IDs of shippings whose queue message has not been sent yet."""
+        kwargs = {"Limit": page_size, "ProjectionExpression": "shipping_id"}
+        while True:
+            response = self._call("scan", self.outbox_table.scan, **kwargs)
+            for item in response["Items"]:
+                yield item["shipping_id"]
+            if "LastEvaluatedKey" not in response:
+                return
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def delete_outbox_entries(self, shipping_ids: list) -> None:
+        """Mark shippings as sent by removing their outbox markers."""
+        self._call("batch_write_item", self._write_batch, table=self.outbox_table,
+                   deletes=[{"shipping_id": shipping_id} for shipping_id in shipping_ids])
+
+    def scan_pages(self, statuses: tuple, segment: int = 0, total_segments: int = 1, page_size: int = 100,
+                   start_key: dict = None):
+        """Lazily yield (items, last_key) pages of shippings with one of ``statuses`` in one scan segment.
+
+        ``last_key`` resumes the segment after that page and is None on the last page.
+        """
+        from boto3.dynamodb.conditions import Attr  # pylint: disable=import-outside-toplevel
+        kwargs = {
+            "Segment": segment,
+            "TotalSegments": total_segments,
+            "Limit": page_size,
+            "FilterExpression": Attr("shipping_status").is_in(list(statuses)),
         }
-        self.table.put_item(Item=item)
-        return shipping_id
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+        while True:
+            response = self._call("scan", self.table.scan, **kwargs)
+            last_key = response.get("LastEvaluatedKey")
+            yield [decode_item(item) for item in response["Items"]], last_key
+            if last_key is None:
+                return
+            kwargs["ExclusiveStartKey"] = last_key
+
+    def delete_shippings(self, shipping_ids: list) -> None:
+        """Delete shippings with batch_writer, 25 per request."""
+        self._call("batch_write_item", self._write_batch, table=self.table,
+                   deletes=[{"shipping_id": shipping_id} for shipping_id in shipping_ids])
+
+    def create_shippings_bulk(self, shippings: list, status: str, outbox: bool = False) -> list[str]:
+        """Create shippings with batch_writer and return their IDs in input order.
+
+        Each entry is a (shipping_type, product_ids, order_id, due_date) tuple.
+        batch_writer sends 25 items per request and resends unprocessed items.
+        With ``outbox`` shippings and their outbox markers are written with
+        transact_write_items instead, TRANSACT_CHUNK_SIZE shippings per transaction.
+        """
+        items = [
+            build_shipping_item(shipping_type, product_ids, order_id, status, due_date)
+            for shipping_type, product_ids, order_id, due_date in shippings
+        ]
+        if not outbox:
+            # Повтор усього батчу безпечний: ті самі елементи просто перезаписуються
+            self._call("batch_write_item", self._write_batch, table=self.table, puts=items)
+            return [item["shipping_id"] for item in items]
+        for start in range(0, len(items), self.TRANSACT_CHUNK_SIZE):
+            chunk = items[start:start + self.TRANSACT_CHUNK_SIZE]
+            actions = []
+            for item in chunk:
+                actions.append({"Put": {"TableName": self.table.name, "Item": item}})
+                actions.append({"Put": {
+                    "TableName": self.outbox_table.name,
+                    "Item": {"shipping_id": item["shipping_id"], "created_at": item["created_at"]},
+                }})
+            # Токен з ID першого елемента робить повтор транзакції ідемпотентним
+            self._call("transact_write_items", self.dynamo_resource.meta.client.transact_write_items,
+                       TransactItems=actions, ClientRequestToken=chunk[0]["shipping_id"])
+        return [item["shipping_id"] for item in items]
+
+    @staticmethod
+    def _write_batch(table, puts: list = (), deletes: list = ()) -> None:
+        with table.batch_writer() as writer:
+            for item in puts:
+                writer.put_item(Item=item)
+            for key in deletes:
+                writer.delete_item(Key=key)
 
     def update_shipping_status(self, shipping_id, status):
-        response = self.table.update_item(
+        response = self._call(
+            "update_item",
+            self.table.update_item,
             Key={
                 'shipping_id': shipping_id,
             },
@@ -43,3 +426,44 @@ class ShippingRepository:
         )
 
         return response
+
+    def finish_shipping(self, shipping_id, now: datetime, on_time_status: str, late_status: str, terminal_statuses: tuple):
+        """Set the final status with a conditional update_item and return the response.
+
+        Returns None when the shipping does not exist or is already in a terminal state.
+        """
+        for update in finish_shipping_updates(now, on_time_status, late_status, terminal_statuses):
+            try:
+                response = self._call("update_item", self.table.update_item, Key={"shipping_id": shipping_id}, **update)
+            except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+                continue
+            response["Attributes"] = decode_item(response["Attributes"])
+            return response
+        return None
+
+    def upgrade_items(self, page_size: int = 100) -> int:
+        """Rewrite version 1 items in the current format and return how many were upgraded.
+
+        Each item is replaced only if its status did not change since it was read,
+        so concurrent status updates are never lost; skipped items are picked up
+        by the next run.
+        """
+        client = self.table.meta.client
+        kwargs = {"Limit": page_size, "FilterExpression": "attribute_not_exists(v)"}
+        upgraded = 0
+        while True:
+            response = self._call("scan", self.table.scan, **kwargs)
+            for item in response["Items"]:
+                try:
+                    self._call(
+                        "put_item", self.table.put_item,
+                        Item=upgrade_item(item),
+                        ConditionExpression="attribute_not_exists(v) AND shipping_status = :status",
+                        ExpressionAttributeValues={":status": item.get("shipping_status")},
+                    )
+                except client.exceptions.ConditionalCheckFailedException:
+                    continue
+                upgraded += 1
+            if "LastEvaluatedKey" not in response:
+                return upgraded
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
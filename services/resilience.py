@@ -0,0 +1,267 @@
+"""
+Retries with jittered backoff, a retry budget and per-operation circuit breakers.
+
+botocore already retries each call a few times; this layer sits on top of it
+for longer throttling episodes. Retries draw from a shared token bucket so a
+spike cannot turn into a retry storm, and an operation that keeps failing
+opens its circuit breaker so callers fail fast instead of piling up.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+from .config import (
+    SHIPPING_RETRY_MAX_ATTEMPTS,
+    SHIPPING_RETRY_BASE_DELAY_SECONDS,
+    SHIPPING_RETRY_MAX_DELAY_SECONDS,
+    SHIPPING_RETRY_BUDGET,
+    SHIPPING_RETRY_BUDGET_REFILL_PER_SECOND,
+    SHIPPING_BREAKER_FAILURE_THRESHOLD,
+    SHIPPING_BREAKER_RESET_SECONDS,
+)
+from .metrics import THROTTLE_CODES, get_metrics
+
+TRANSIENT_CODES = THROTTLE_CODES | {
+    "InternalServerError",
+    "InternalFailure",
+    "ServiceUnavailable",
+    "RequestTimeout",
+    "RequestTimeoutException",
+}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an operation whose circuit breaker is open."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Tell throttling and transient endpoint errors from errors a retry cannot fix."""
+    # pylint: disable-next=import-outside-toplevel
+    from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, HTTPClientError
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in TRANSIENT_CODES
+    return isinstance(error, (BotocoreConnectionError, HTTPClientError))
+
+
+def backoff_delay(attempt: int, base_delay: float = SHIPPING_RETRY_BASE_DELAY_SECONDS,
+                  max_delay: float = SHIPPING_RETRY_MAX_DELAY_SECONDS) -> float:
+    """Return a "full jitter" delay for the given retry attempt (1 for the first retry)."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class RetryBudget:
+    """Token bucket limiting how many retries the process makes.
+
+    Every retry takes a token; tokens refill at ``refill_per_second`` up to
+    ``capacity``. First attempts are never limited.
+    """
+
+    def __init__(self, capacity: float = SHIPPING_RETRY_BUDGET,
+                 refill_per_second: float = SHIPPING_RETRY_BUDGET_REFILL_PER_SECOND, clock=time.monotonic):
+        """Initialize a full bucket."""
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._clock = clock
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def acquire(self) -> bool:
+        """Take a token for one retry; False when the budget is spent."""
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+
+
+class CircuitBreaker:
+    """Open after ``failure_threshold`` consecutive retryable failures.
+
+    An open breaker rejects calls for ``reset_seconds``, then lets a single
+    trial call through (half-open); its outcome closes or reopens the breaker.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = SHIPPING_BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = SHIPPING_BREAKER_RESET_SECONDS, clock=time.monotonic):
+        """Initialize a closed breaker."""
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self._clock = clock
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> None:
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN:
+                if self._clock() - self._opened_at < self.reset_seconds:
+                    raise CircuitOpenError(f"Circuit for {self.name} is open")
+                self._set_state(HALF_OPEN)
+            if self._trial_running:
+                raise CircuitOpenError(f"Circuit for {self.name} is half-open")
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+            if self._state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                if self._state != OPEN:
+                    self._set_state(OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        get_metrics().increment("circuit_breaker_transitions_total", operation=self.name, state=state)
+
+
+class Resilience:
+    """Run calls through their operation's circuit breaker, retrying retryable errors."""
+
+    def __init__(
+        self,
+        max_attempts: int = SHIPPING_RETRY_MAX_ATTEMPTS,
+        base_delay: float = SHIPPING_RETRY_BASE_DELAY_SECONDS,
+        max_delay: float = SHIPPING_RETRY_MAX_DELAY_SECONDS,
+        budget: RetryBudget = None,
+        failure_threshold: int = SHIPPING_BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = SHIPPING_BREAKER_RESET_SECONDS,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        """Initialize the retry policy; breakers are created per operation on first use."""
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget(clock=clock)
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._sleep = sleep
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, operation: str) -> CircuitBreaker:
+        breaker = self._breakers.get(operation)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    operation, CircuitBreaker(operation, self.failure_threshold, self.reset_seconds, self._clock)
+                )
+        return breaker
+
+    def states(self) -> dict[str, str]:
+        """Return the circuit breaker state of every operation called so far."""
+        return {operation: breaker.state for operation, breaker in list(self._breakers.items())}
+
+    def call(self, operation: str, function, *args, **kwargs):
+        """Call ``function`` as ``operation`` and return its result."""
+        breaker = self.breaker(operation)
+        attempt = 0
+        while True:
+            breaker.allow()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as error:
+                attempt += 1
+                delay = self._retry_delay(operation, breaker, error, attempt)
+                if delay is None:
+                    raise
+                self._sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    async def call_async(self, operation: str, function, *args, **kwargs):
+        """Await ``function`` as ``operation`` with the same breaker and retry policy as call()."""
+        breaker = self.breaker(operation)
+        attempt = 0
+        while True:
+            breaker.allow()
+            try:
+                result = await function(*args, **kwargs)
+            except Exception as error:
+                attempt += 1
+                delay = self._retry_delay(operation, breaker, error, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    def _retry_delay(self, operation: str, breaker: CircuitBreaker, error: Exception, attempt: int):
+        """Record a failed attempt and return the backoff before the next one, or None to give up."""
+        if not is_retryable(error):
+            # Помилка запиту (наприклад, невиконана умова) не свідчить про стан сервісу
+            breaker.record_success()
+            return None
+        breaker.record_failure()
+        if attempt >= self.max_attempts or not self.budget.acquire():
+            return None
+        get_metrics().increment("retries_total", operation=operation)
+        return backoff_delay(attempt, self.base_delay, self.max_delay)
+
+
+_resilience = None
+_resilience_lock = threading.Lock()
+
+
+def get_resilience() -> Resilience:
+    """Return the process-wide Resilience shared by repositories and publishers."""
+    global _resilience  # pylint: disable=global-statement
+    if _resilience is None:
+        with _resilience_lock:
+            if _resilience is None:
+                _resilience = Resilience()
+    return _resilience
+
+
+def _reset_after_fork() -> None:
+    # Локи могли бути захоплені іншим потоком батьківського процесу
+    global _resilience, _resilience_lock  # pylint: disable=global-statement
+    _resilience = None
+    _resilience_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,249 @@
+"""
+Scheduler that processes shippings when they fall due.
+
+Run it with ``python -m services.scheduler``.
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from .config import (
+    SHIPPING_SCHEDULER_LEAD_SECONDS,
+    SHIPPING_SCHEDULER_HORIZON_SECONDS,
+    SHIPPING_SCHEDULER_REFRESH_SECONDS,
+    SHIPPING_SCHEDULER_CHECKPOINT_PATH,
+)
+from .publisher import ShippingPublisher
+from .repository import ShippingRepository
+from .service import ShippingService, ShippingStateError
+
+logger = logging.getLogger(__name__)
+
+
+class DueDateScheduler:
+    """Min-heap of pending shippings keyed by due date, fired in batches.
+
+    Created shippings due within ``horizon_seconds`` are loaded from the
+    status/due_at index every ``refresh_seconds``; ``schedule()`` adds one
+    right away. The scheduler sleeps until the earliest deadline and then
+    calls ShippingService.process_shipping for everything due, ``lead_seconds``
+    before the due date so that on-time shippings complete. Shippings that are
+    already overdue when loaded are processed at once and fail.
+
+    With ``checkpoint_path`` the pending heap is saved after every batch and
+    loaded on start, so a restarted scheduler fires without waiting for the
+    first index query.
+    """
+
+    RETRY_SECONDS: float = 1.0
+
+    def __init__(
+        self,
+        service: ShippingService,
+        lead_seconds: float = SHIPPING_SCHEDULER_LEAD_SECONDS,
+        horizon_seconds: float = SHIPPING_SCHEDULER_HORIZON_SECONDS,
+        refresh_seconds: float = SHIPPING_SCHEDULER_REFRESH_SECONDS,
+        concurrency: int = 8,
+        checkpoint_path: str = SHIPPING_SCHEDULER_CHECKPOINT_PATH,
+        clock=time.time,
+    ):
+        """Initialize an empty scheduler for the given service."""
+        self.service = service
+        self.lead_seconds = lead_seconds
+        self.horizon_seconds = horizon_seconds
+        self.refresh_seconds = refresh_seconds
+        self.concurrency = concurrency
+        self.checkpoint_path = checkpoint_path
+        self.fired = 0
+        self.failed = 0
+        self._clock = clock
+        # (момент запуску, shipping_id); момент - unix time з урахуванням lead_seconds
+        self._heap: list = []
+        self._scheduled: set = set()
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+
+    def __enter__(self) -> 'DueDateScheduler':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def next_deadline(self) -> float:
+        """Return the unix time of the earliest pending deadline, or None."""
+        with self._condition:
+            return self._heap[0][0] if self._heap else None
+
+    def schedule(self, shipping_id: str, due_date: datetime) -> None:
+        """Add a shipping to the heap; shippings already scheduled are ignored."""
+        due_at = due_date.replace(tzinfo=timezone.utc) if due_date.tzinfo is None else due_date
+        self._push(due_at.timestamp() - self.lead_seconds, shipping_id)
+
+    def _push(self, deadline: float, shipping_id: str) -> None:
+        with self._condition:
+            if shipping_id in self._scheduled:
+                return
+            self._scheduled.add(shipping_id)
+            heapq.heappush(self._heap, (deadline, shipping_id))
+            if self._heap[0][1] == shipping_id:
+                # Новий найближчий дедлайн - будимо цикл, щоб він перерахував час сну
+                self._condition.notify()
+
+    def refresh(self) -> int:
+        """Load created shippings due within the horizon and return how many were new."""
+        horizon = datetime.fromtimestamp(self._clock() + self.horizon_seconds + self.lead_seconds, timezone.utc)
+        before = len(self._scheduled)
+        for item in self.service.repository.iter_shippings(ShippingService.SHIPPING_CREATED, due_before=horizon):
+            self.schedule(item["shipping_id"], item["due_date"])
+        return len(self._scheduled) - before
+
+    def pop_due(self, max_items: int = None) -> list[str]:
+        """Remove and return the shippings whose deadline has passed."""
+        now = self._clock()
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now and (max_items is None or len(due) < max_items):
+                _, shipping_id = heapq.heappop(self._heap)
+                self._scheduled.discard(shipping_id)
+                due.append(shipping_id)
+        return due
+
+    def run_due(self) -> int:
+        """Process every shipping that is due now and return how many were processed."""
+        due = self.pop_due()
+        if not due:
+            return 0
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix="shipping-scheduler")
+        processed = sum(self._pool.map(self._process, due))
+        self.save_checkpoint()
+        return processed
+
+    def _process(self, shipping_id: str) -> bool:
+        try:
+            self.service.process_shipping(shipping_id)
+        except ShippingStateError:
+            # Уже оброблено воркером або іншим планувальником
+            return False
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to process shipping %s", shipping_id)
+            with self._condition:
+                self.failed += 1
+            self._push(self._clock() + self.RETRY_SECONDS, shipping_id)
+            return False
+        with self._condition:
+            self.fired += 1
+        return True
+
+    def run(self) -> None:
+        """Fire shippings as they fall due until stop() is called."""
+        self.load_checkpoint()
+        next_refresh = 0.0
+        while not self._stop.is_set():
+            if self._clock() >= next_refresh:
+                try:
+                    self.refresh()
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Failed to load pending shippings")
+                next_refresh = self._clock() + self.refresh_seconds
+            self.run_due()
+            with self._condition:
+                deadline = self._heap[0][0] if self._heap else next_refresh
+                timeout = min(deadline, next_refresh) - self._clock()
+                if timeout > 0 and not self._stop.is_set():
+                    self._condition.wait(timeout)
+
+    def start(self) -> None:
+        """Run the scheduler in a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="shipping-scheduler", daemon=True)
+        self._thread.start()
+
+    def request_stop(self) -> None:
+        """Ask the run loop to exit; safe to call from a signal handler."""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    def stop(self) -> None:
+        """Stop the scheduler and save a final checkpoint."""
+        self.request_stop()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.save_checkpoint()
+
+    def save_checkpoint(self) -> None:
+        """Atomically write the pending heap to checkpoint_path."""
+        if not self.checkpoint_path:
+            return
+        with self._condition:
+            pending = sorted(self._heap)
+        checkpoint = {
+            "saved_at": datetime.now(timezone.utc).isoformat(),
+            "lead_seconds": self.lead_seconds,
+            "pending": [[deadline, shipping_id] for deadline, shipping_id in pending],
+        }
+        temporary_path = f"{self.checkpoint_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(checkpoint, file)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def load_checkpoint(self) -> int:
+        """Schedule the shippings saved in checkpoint_path and return how many were loaded."""
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path, encoding="utf-8") as file:
+            checkpoint = json.load(file)
+        # Дедлайни перераховуються, якщо lead_seconds змінився між запусками
+        shift = checkpoint.get("lead_seconds", self.lead_seconds) - self.lead_seconds
+        for deadline, shipping_id in checkpoint["pending"]:
+            self._push(deadline + shift, shipping_id)
+        return len(checkpoint["pending"])
+
+
+def main(argv: list[str] = None) -> None:
+    """Command line entry point for the due-date scheduler."""
+    parser = argparse.ArgumentParser(description="Process shippings when they fall due.")
+    parser.add_argument("--lead", type=float, default=SHIPPING_SCHEDULER_LEAD_SECONDS)
+    parser.add_argument("--horizon", type=float, default=SHIPPING_SCHEDULER_HORIZON_SECONDS)
+    parser.add_argument("--refresh", type=float, default=SHIPPING_SCHEDULER_REFRESH_SECONDS)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--checkpoint", default=SHIPPING_SCHEDULER_CHECKPOINT_PATH)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    scheduler = DueDateScheduler(
+        ShippingService(ShippingRepository(), ShippingPublisher()),
+        lead_seconds=args.lead,
+        horizon_seconds=args.horizon,
+        refresh_seconds=args.refresh,
+        concurrency=args.concurrency,
+        checkpoint_path=args.checkpoint,
+    )
+    # Сигнал лише зупиняє цикл; пул і контрольна точка закриваються після виходу з run()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: scheduler.request_stop())
+    scheduler.run()
+    scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,40 @@
+import threading
 import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+from .config import SHIPPING_IDEMPOTENCY_CACHE_SIZE, SHIPPING_SCHEDULER_LEAD_SECONDS
+from .metrics import timed
 from .repository import ShippingRepository
 from .publisher import ShippingPublisher
 
 
+class ShippingStateError(ValueError):
+    """Raised when a shipping does not exist or is already in a terminal state."""
+
+
+class ShippingRequest(NamedTuple):
+    """Arguments of a single create_shipping call."""
+
+    shipping_type: str
+    product_ids: list[str]
+    order_id: str
+    due_date: datetime
+
+
+@dataclass
+class BulkShippingResult:
+    """Result of ShippingService.create_shippings.
+
+    ``shipping_ids`` follows the input order and holds None where the shipping was
+    not created; ``errors`` maps input indexes to the error for that item.
+    """
+
+    shipping_ids: list[Optional[str]]
+    errors: dict[int, Exception] = field(default_factory=dict)
+
+
 class ShippingService:
     """Service for managing shipping operations."""
 
@@ -11,45 +42,181 @@ class ShippingService:
     SHIPPING_IN_PROGRESS: str = 'in progress'
     SHIPPING_COMPLETED: str = 'completed'
     SHIPPING_FAILED: str = 'failed'
+    TERMINAL_STATUSES: tuple = (SHIPPING_COMPLETED, SHIPPING_FAILED)
+
+    def __init__(self, repository: ShippingRepository, publisher: ShippingPublisher, use_outbox: bool = False,
+                 delay_until_due: bool = False):
+        """Initialize ShippingService with repository and publisher.
 
-    def __init__(self, repository: ShippingRepository, publisher: ShippingPublisher):
-        """Initialize ShippingService with repository and publisher."""
+        With ``use_outbox`` create_shipping and create_shippings only write to the
+        database; queue messages are sent later by an OutboxRelay. With
+        ``delay_until_due`` the queue message of a shipping due within 15 minutes
+        is delayed until shortly before its due date, so the worker processes it
+        on time; this applies only to messages create_shipping sends itself, not
+        to create_shippings or to messages sent by the relay.
+        """
         self.repository = repository
         self.publisher = publisher
+        self.use_outbox = use_outbox
+        self.delay_until_due = delay_until_due
+        # (order_id, idempotency_key) -> shipping_id нещодавніх замовлень цього процесу
+        self._recent_keys: OrderedDict = OrderedDict()
+        self._recent_keys_lock = threading.Lock()
 
     @staticmethod
     def list_available_shipping_type() -> list[str]:
         """Return list of available shipping types."""
         return ['Нова Пошта', 'Укр Пошта', 'Meest Express', 'Самовивіз']
 
-    def create_shipping(self, shipping_type: str, product_ids: list[str], order_id: str, due_date: datetime) -> str:
-        """Create a new shipping record and send it to the queue."""
+    @timed("create_shipping")
+    def create_shipping(self, shipping_type: str, product_ids: list[str], order_id: str, due_date: datetime,
+                        idempotency_key: str = None) -> str:
+        """Create a new shipping record and send it to the queue.
+
+        With an ``idempotency_key`` a retried call for the same order returns the
+        shipping created by the first call instead of creating a new one.
+        """
         if shipping_type not in self.list_available_shipping_type():
             raise ValueError("Shipping type is not available")
+        if idempotency_key is not None:
+            return self._create_shipping_once(shipping_type, product_ids, order_id, due_date, idempotency_key)[0]
+        if self.use_outbox:
+            return self.repository.create_shipping(
+                shipping_type, product_ids, order_id, self.SHIPPING_CREATED, due_date, outbox=True
+            )
         # Використовуємо shipping_id, повернутий repository.create_shipping
         shipping_id = self.repository.create_shipping(shipping_type, product_ids, order_id, self.SHIPPING_CREATED, due_date)
         if not shipping_id:  # Якщо repository не повертає shipping_id, генеруємо новий
             shipping_id = str(uuid.uuid4())
-        self.publisher.send_new_shipping(shipping_id)
+        self._publish(shipping_id, due_date)
         return shipping_id
 
+    def _publish(self, shipping_id: str, due_date: datetime) -> None:
+        if not self.delay_until_due:
+            self.publisher.send_new_shipping(shipping_id)
+            return
+        due_at = due_date.replace(tzinfo=timezone.utc) if due_date.tzinfo is None else due_date
+        delay = (due_at - datetime.now(timezone.utc)).total_seconds() - SHIPPING_SCHEDULER_LEAD_SECONDS
+        self.publisher.send_new_shipping(shipping_id, delay_seconds=max(0.0, delay))
+
+    def _remember(self, key: tuple, shipping_id: str) -> None:
+        with self._recent_keys_lock:
+            self._recent_keys[key] = shipping_id
+            if len(self._recent_keys) > SHIPPING_IDEMPOTENCY_CACHE_SIZE:
+                self._recent_keys.popitem(last=False)
+
+    def create_shipping_once(self, shipping_type: str, product_ids: list[str], order_id: str, due_date: datetime,
+                             idempotency_key: str) -> tuple[str, bool]:
+        """Create the shipping for (order_id, idempotency_key) unless it exists; return (shipping_id, created).
+
+        ``created`` is False for a retried or concurrent duplicate, so callers can
+        undo their own side effects, such as taking stock.
+        """
+        if shipping_type not in self.list_available_shipping_type():
+            raise ValueError("Shipping type is not available")
+        return self._create_shipping_once(shipping_type, product_ids, order_id, due_date, idempotency_key)
+
+    def _create_shipping_once(self, shipping_type: str, product_ids: list[str], order_id: str, due_date: datetime,
+                              idempotency_key: str) -> tuple[str, bool]:
+        key = (order_id, idempotency_key)
+        with self._recent_keys_lock:
+            shipping_id = self._recent_keys.get(key)
+        if shipping_id is not None:
+            return shipping_id, False
+
+        shipping_id, created = self.repository.create_shipping_once(
+            shipping_type, product_ids, order_id, self.SHIPPING_CREATED, due_date, idempotency_key,
+            outbox=self.use_outbox
+        )
+        if not self.use_outbox:
+            # Повтор після збою між записом і відправкою не повинен загубити повідомлення;
+            # дубль відсіє FIFO-черга за MessageDeduplicationId або обробник за станом
+            self._publish(shipping_id, due_date)
+        self._remember(key, shipping_id)
+        return shipping_id, created
+
+    @timed("create_shippings")
+    def create_shippings(self, requests: list[ShippingRequest]) -> BulkShippingResult:
+        """Create many shippings with batched writes and batched queue messages.
+
+        With ``use_outbox`` shippings are written with their outbox markers and
+        nothing is sent here. Messages are never delayed (see ``delay_until_due``).
+        """
+        requests = [ShippingRequest(*request) for request in requests]
+        result = BulkShippingResult(shipping_ids=[None] * len(requests))
+        valid = []
+        for index, request in enumerate(requests):
+            if request.shipping_type not in self.list_available_shipping_type():
+                result.errors[index] = ValueError("Shipping type is not available")
+            else:
+                valid.append(index)
+        if not valid:
+            return result
+
+        try:
+            shipping_ids = self.repository.create_shippings_bulk(
+                [requests[index] for index in valid], self.SHIPPING_CREATED, outbox=self.use_outbox
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            for index in valid:
+                result.errors[index] = error
+            return result
+        for index, shipping_id in zip(valid, shipping_ids):
+            result.shipping_ids[index] = shipping_id
+        if self.use_outbox:
+            return result
+
+        # Запис у базі вже існує, тому помилка відправки не скасовує shipping_id
+        index_by_id = dict(zip(shipping_ids, valid))
+        batch_size = self.publisher.MAX_BATCH_SIZE
+        for start in range(0, len(shipping_ids), batch_size):
+            batch = shipping_ids[start:start + batch_size]
+            try:
+                failed = self.publisher.send_shippings_batch(batch)
+            except Exception as error:  # pylint: disable=broad-except
+                for shipping_id in batch:
+                    result.errors[index_by_id[shipping_id]] = error
+                continue
+            for shipping_id in failed:
+                result.errors[index_by_id[shipping_id]] = RuntimeError("Failed to publish shipping")
+        return result
+
+    @timed("process_shipping")
     def process_shipping(self, shipping_id: str) -> dict:
-        """Process a shipping by checking its due date and updating status."""
-        shipping = self.repository.get_shipping(shipping_id)
-        if datetime.fromisoformat(shipping['due_date']) < datetime.now(timezone.utc):
-            return self.fail_shipping(shipping_id)
-        return self.complete_shipping(shipping_id)
+        """Process a shipping by checking its due date and updating status in one conditional write."""
+        response = self.repository.finish_shipping(
+            shipping_id, datetime.now(timezone.utc),
+            self.SHIPPING_COMPLETED, self.SHIPPING_FAILED, self.TERMINAL_STATUSES
+        )
+        if response is None:
+            raise ShippingStateError(f"Shipping {shipping_id} does not exist or is already processed")
+        return response['ResponseMetadata']
 
+    @timed("check_status")
     def check_status(self, shipping_id: str) -> str:
         """Check the status of a shipping."""
-        shipping = self.repository.get_shipping(shipping_id)
+        shipping = self.repository.get_shipping(shipping_id, attributes=["shipping_status"])
         return shipping['shipping_status']
 
+    @timed("check_status_many")
+    def check_status_many(self, shipping_ids: list[str], consistent_read: bool = False) -> dict[str, str]:
+        """Check the statuses of many shippings; unknown shipping IDs are left out."""
+        shippings = self.repository.get_shippings(
+            shipping_ids, attributes=["shipping_status"], consistent_read=consistent_read
+        )
+        return {shipping_id: shipping['shipping_status'] for shipping_id, shipping in shippings.items()}
+
+    def iter_overdue_shippings(self, now: datetime = None):
+        """Lazily yield created shippings whose due date has passed."""
+        return self.repository.iter_shippings(self.SHIPPING_CREATED, due_before=now or datetime.now(timezone.utc))
+
+    @timed("fail_shipping")
     def fail_shipping(self, shipping_id: str) -> dict:
         """Mark a shipping as failed."""
         response = self.repository.update_shipping_status(shipping_id, self.SHIPPING_FAILED)
         return response['ResponseMetadata']
 
+    @timed("complete_shipping")
     def complete_shipping(self, shipping_id: str) -> dict:
         """Mark a shipping as completed."""
         response = self.repository.update_shipping_status(shipping_id, self.SHIPPING_COMPLETED)
@@ -0,0 +1,241 @@
+"""
+SQLite shipping storage for edge deployments and local load tests.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from .codec import DATE_ATTRIBUTES, decode_item, to_epoch
+from .config import SHIPPING_SQLITE_PATH
+from .repository import (
+    ShippingRepository,
+    _to_iso,
+    build_shipping_item,
+    idempotent_shipping_id,
+    ok_response,
+    project_item,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shippings (
+    shipping_id TEXT PRIMARY KEY,
+    shipping_type TEXT,
+    order_id TEXT,
+    product_ids TEXT,
+    shipping_status TEXT,
+    created_date TEXT,
+    due_date TEXT,
+    idempotency_key TEXT,
+    created_at REAL,
+    due_at REAL,
+    v INTEGER
+);
+CREATE TABLE IF NOT EXISTS shipping_outbox (
+    shipping_id TEXT PRIMARY KEY,
+    created_at REAL
+);
+"""
+
+# Файли, створені до версії 2 елементів, мають лише рядкові created_date/due_date
+UPGRADE_SCHEMA = """
+ALTER TABLE shippings ADD COLUMN created_at REAL;
+ALTER TABLE shippings ADD COLUMN due_at REAL;
+ALTER TABLE shippings ADD COLUMN v INTEGER;
+DROP INDEX IF EXISTS shippings_status_due_date;
+DROP INDEX IF EXISTS shippings_due_date;
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS shippings_status_due_at ON shippings (shipping_status, due_at, shipping_id);
+CREATE INDEX IF NOT EXISTS shippings_order_id ON shippings (order_id, shipping_id);
+CREATE INDEX IF NOT EXISTS shippings_due_at ON shippings (due_at);
+"""
+
+COLUMNS = ("shipping_id", "shipping_type", "order_id", "product_ids", "shipping_status", "created_at", "due_at", "v",
+           "idempotency_key")
+_INSERT = f"INSERT INTO shippings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+def _row(item: dict) -> tuple:
+    # Списки зберігаються як JSON, епохи - як REAL
+    row = dict(item, product_ids=json.dumps(item["product_ids"]))
+    for column in DATE_ATTRIBUTES.values():
+        row[column] = float(item[column])
+    return tuple(row.get(column) for column in COLUMNS)
+
+
+def _item(row: sqlite3.Row) -> dict:
+    # Відсутні атрибути не повертаємо, як і DynamoDB
+    item = {key: row[key] for key in row.keys() if row[key] is not None}
+    if item.get("v") and "product_ids" in item:
+        item["product_ids"] = json.loads(item["product_ids"])
+    return decode_item(item)
+
+
+class SQLiteShippingRepository(ShippingRepository):
+    """Shipping storage in a SQLite database file in WAL mode.
+
+    Every thread gets its own connection, so readers never block each other or
+    the single writer. Writes that touch several rows run in one
+    ``BEGIN IMMEDIATE`` transaction.
+    """
+
+    IN_CHUNK_SIZE: int = 500
+
+    def __init__(self, path: str = SHIPPING_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.executescript(SCHEMA)
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(shippings)")}
+        if "due_at" not in columns:
+            connection.executescript(UPGRADE_SCHEMA)
+        connection.executescript(INDEXES)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        # З'єднання не можна використовувати в дочірньому процесі після fork
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def get_shipping(self, shipping_id, attributes: list = None):
+        row = self._connection().execute("SELECT * FROM shippings WHERE shipping_id = ?", (shipping_id,)).fetchone()
+        return project_item(_item(row), attributes) if row else None
+
+    def get_shippings(self, shipping_ids: list, attributes: list = None, consistent_read: bool = False) -> dict:
+        shippings = {}
+        unique_ids = list(dict.fromkeys(shipping_ids))
+        for start in range(0, len(unique_ids), self.IN_CHUNK_SIZE):
+            chunk = unique_ids[start:start + self.IN_CHUNK_SIZE]
+            rows = self._connection().execute(
+                f"SELECT * FROM shippings WHERE shipping_id IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            for row in rows:
+                shippings[row["shipping_id"]] = project_item(_item(row), attributes)
+        return shippings
+
+    def iter_shippings(self, status: str, due_before: datetime = None, due_after: datetime = None, page_size: int = 100):
+        conditions = ["shipping_status = ?", "due_at IS NOT NULL"]
+        params = [status]
+        if due_before and due_after:
+            conditions.append("due_at BETWEEN ? AND ?")
+            params += [float(to_epoch(due_after)), float(to_epoch(due_before))]
+        elif due_before:
+            conditions.append("due_at < ?")
+            params.append(float(to_epoch(due_before)))
+        elif due_after:
+            conditions.append("due_at >= ?")
+            params.append(float(to_epoch(due_after)))
+        return self._query_pages(conditions, params, ("due_at", "shipping_id"), page_size)
+
+    def iter_by_order(self, order_id: str, page_size: int = 100):
+        return self._query_pages(["order_id = ?"], [order_id], ("shipping_id",), page_size)
+
+    def _query_pages(self, conditions: list, params: list, order: tuple, page_size: int):
+        # Пагінація за ключем сортування, а не OFFSET, щоб кожна сторінка йшла по індексу
+        where = " AND ".join(conditions)
+        order_by = ", ".join(order)
+        after = ()
+        while True:
+            keyset = f" AND ({order_by}) > ({', '.join('?' * len(order))})" if after else ""
+            rows = self._connection().execute(
+                f"SELECT * FROM shippings WHERE {where}{keyset} ORDER BY {order_by} LIMIT ?",
+                (*params, *after, page_size),
+            ).fetchall()
+            yield from map(_item, rows)
+            if len(rows) < page_size:
+                return
+            after = tuple(rows[-1][column] for column in order)
+
+    def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime,
+                        outbox: bool = False):
+        item = build_shipping_item(shipping_type, product_ids, order_id, status, due_date)
+        with self._transaction() as connection:
+            connection.execute(_INSERT, _row(item))
+            if outbox:
+                connection.execute("INSERT INTO shipping_outbox VALUES (?, ?)",
+                                   (item["shipping_id"], float(item["created_at"])))
+        return item["shipping_id"]
+
+    def create_shipping_once(self, shipping_type: str, product_ids: list, order_id: str, status: str,
+                             due_date: datetime, idempotency_key: str, outbox: bool = False) -> tuple:
+        shipping_id = idempotent_shipping_id(order_id, idempotency_key)
+        item = build_shipping_item(shipping_type, product_ids, order_id, status, due_date, shipping_id)
+        item["idempotency_key"] = idempotency_key
+        with self._transaction() as connection:
+            created = connection.execute(_INSERT + " ON CONFLICT (shipping_id) DO NOTHING", _row(item)).rowcount == 1
+            if created and outbox:
+                connection.execute("INSERT INTO shipping_outbox VALUES (?, ?)", (shipping_id, float(item["created_at"])))
+        return shipping_id, created
+
+    def create_shippings_bulk(self, shippings: list, status: str, outbox: bool = False) -> list[str]:
+        items = [
+            build_shipping_item(shipping_type, product_ids, order_id, status, due_date)
+            for shipping_type, product_ids, order_id, due_date in shippings
+        ]
+        with self._transaction() as connection:
+            connection.executemany(_INSERT, map(_row, items))
+            if outbox:
+                connection.executemany("INSERT INTO shipping_outbox VALUES (?, ?)",
+                                       ((item["shipping_id"], float(item["created_at"])) for item in items))
+        return [item["shipping_id"] for item in items]
+
+    def update_shipping_status(self, shipping_id, status):
+        self._connection().execute(
+            "INSERT INTO shippings (shipping_id, shipping_status) VALUES (?, ?) "
+            "ON CONFLICT (shipping_id) DO UPDATE SET shipping_status = excluded.shipping_status",
+            (shipping_id, status),
+        )
+        return ok_response()
+
+    def finish_shipping(self, shipping_id, now: datetime, on_time_status: str, late_status: str, terminal_statuses: tuple):
+        # Рядки версії 1 порівнюються за рядковим due_date
+        rows = self._connection().execute(
+            "UPDATE shippings SET shipping_status = "
+            "CASE WHEN COALESCE(due_at >= ?, due_date >= ?) THEN ? ELSE ? END "
+            "WHERE shipping_id = ? AND (due_at IS NOT NULL OR due_date IS NOT NULL) "
+            f"AND shipping_status NOT IN ({', '.join('?' * len(terminal_statuses))}) "
+            "RETURNING shipping_status",
+            (float(to_epoch(now)), _to_iso(now), on_time_status, late_status, shipping_id, *terminal_statuses),
+        ).fetchall()
+        return ok_response(Attributes={"shipping_status": rows[0]["shipping_status"]}) if rows else None
+
+    def iter_outbox(self, page_size: int = 100):
+        after = ""
+        while True:
+            rows = self._connection().execute(
+                "SELECT shipping_id FROM shipping_outbox WHERE shipping_id > ? ORDER BY shipping_id LIMIT ?",
+                (after, page_size),
+            ).fetchall()
+            for row in rows:
+                yield row["shipping_id"]
+            if len(rows) < page_size:
+                return
+            after = rows[-1]["shipping_id"]
+
+    def delete_outbox_entries(self, shipping_ids: list) -> None:
+        with self._transaction() as connection:
+            connection.executemany(
+                "DELETE FROM shipping_outbox WHERE shipping_id = ?", ((shipping_id,) for shipping_id in shipping_ids)
+            )
@@ -0,0 +1,233 @@
+"""
+Worker that drains the shipping queue and processes shippings concurrently.
+
+Run it with ``python -m services.worker``.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import (
+    SHIPPING_METRICS_PORT,
+    SHIPPING_WORKER_CONCURRENCY,
+    SHIPPING_WORKER_MAX_RECEIVE_COUNT,
+    SHIPPING_WORKER_VISIBILITY_TIMEOUT,
+)
+from .metrics import serve_prometheus
+from .poller import AdaptivePoller, ReceivedShipping
+from .publisher import ShippingPublisher
+from .repository import ShippingRepository
+from .service import ShippingService, ShippingStateError
+
+logger = logging.getLogger(__name__)
+
+
+class ShippingWorker:
+    """Poll loop feeding a bounded thread pool that calls ShippingService.process_shipping.
+
+    Messages are received by an AdaptivePoller sized to the pool's free slots.
+    Messages are deleted in batches only after they were processed successfully;
+    failed messages become visible again and are redelivered by SQS. A message
+    that fails on its ``max_receive_count``-th delivery is moved to the
+    dead-letter queue instead (0 leaves that to the queue's RedrivePolicy, if
+    any). Messages that are still being processed get their visibility timeout
+    extended.
+    """
+
+    def __init__(
+        self,
+        service: ShippingService,
+        publisher: ShippingPublisher,
+        concurrency: int = SHIPPING_WORKER_CONCURRENCY,
+        max_in_flight: int = None,
+        visibility_timeout: int = SHIPPING_WORKER_VISIBILITY_TIMEOUT,
+        wait_time_seconds: int = 10,
+        max_receive_count: int = SHIPPING_WORKER_MAX_RECEIVE_COUNT,
+    ):
+        """Initialize the worker with its service, publisher and pool limits."""
+        self.service = service
+        self.publisher = publisher
+        self.concurrency = concurrency
+        self.max_in_flight = max_in_flight or concurrency * 2
+        self.visibility_timeout = visibility_timeout
+        self.wait_time_seconds = wait_time_seconds
+        self.max_receive_count = max_receive_count
+        self.poller = AdaptivePoller(
+            publisher, max_wait_time_seconds=wait_time_seconds, visibility_timeout=visibility_timeout
+        )
+        self.processed = 0
+        self.failed = 0
+        self.dead_lettered = 0
+        self._stop = threading.Event()
+        self._lock = threading.Condition()
+        self._in_flight: dict[str, float] = {}
+        self._acks: list[str] = []
+
+    def stop(self) -> None:
+        """Ask the worker to finish in-flight messages and exit."""
+        self._stop.set()
+        with self._lock:
+            self._lock.notify_all()
+
+    def run(self) -> None:
+        """Poll and process messages until stop() is called."""
+        heartbeat = threading.Thread(target=self._heartbeat, name="shipping-worker-heartbeat", daemon=True)
+        heartbeat.start()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="shipping-worker") as pool:
+            while not self._stop.is_set():
+                free_slots = self._wait_for_capacity()
+                if not free_slots:
+                    continue
+                try:
+                    messages = self.poller.poll(free_slots)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Failed to receive shipping messages")
+                    self._stop.wait(1)
+                    continue
+                for message in messages:
+                    with self._lock:
+                        self._in_flight[message.receipt_handle] = time.monotonic()
+                    pool.submit(self._handle, message)
+                self._flush_acks()
+        self._stop.set()
+        self.poller.close()
+        heartbeat.join()
+        self._flush_acks()
+
+    def _wait_for_capacity(self) -> int:
+        with self._lock:
+            while not self._stop.is_set() and len(self._in_flight) >= self.max_in_flight:
+                self._lock.wait()
+            if self._stop.is_set():
+                return 0
+            return self.max_in_flight - len(self._in_flight)
+
+    def _handle(self, message: ReceivedShipping) -> None:
+        handle = message.receipt_handle
+        try:
+            self.service.process_shipping(message.shipping_id)
+        except ShippingStateError:
+            # Повторна доставка вже обробленого повідомлення - просто видаляємо його
+            logger.warning("Shipping %s is already processed", message.shipping_id)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception(
+                "Failed to process shipping %s (delivery %d)", message.shipping_id, message.receive_count
+            )
+            dead_lettered = self._dead_letter(message)
+            with self._lock:
+                self.failed += 1
+                self.dead_lettered += dead_lettered
+                del self._in_flight[handle]
+                self._lock.notify()
+            return
+        with self._lock:
+            self.processed += 1
+            self._acks.append(handle)
+            del self._in_flight[handle]
+            self._lock.notify()
+
+    def _dead_letter(self, message: ReceivedShipping) -> bool:
+        if not self.max_receive_count or message.receive_count < self.max_receive_count:
+            return False
+        try:
+            self.publisher.send_to_dead_letter_queue(message.shipping_id, message.receipt_handle)
+        except Exception:  # pylint: disable=broad-except
+            # Повідомлення повернеться в чергу, і спробуємо ще раз на наступній доставці
+            logger.exception("Failed to move shipping %s to the dead-letter queue", message.shipping_id)
+            return False
+        logger.error("Moved shipping %s to the dead-letter queue after %d deliveries",
+                     message.shipping_id, message.receive_count)
+        return True
+
+    def _flush_acks(self) -> None:
+        with self._lock:
+            acks, self._acks = self._acks, []
+        if not acks:
+            return
+        try:
+            failed = self.publisher.delete_shippings(acks)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to delete %d processed messages", len(acks))
+            failed = acks
+        if failed:
+            # Повідомлення повернеться в чергу, тому пробуємо видалити його ще раз
+            with self._lock:
+                self._acks.extend(failed)
+
+    def _heartbeat(self) -> None:
+        interval = max(self.visibility_timeout / 3, 0.1)
+        while not self._stop.wait(interval):
+            self._flush_acks()
+            now = time.monotonic()
+            with self._lock:
+                slow = [handle for handle, started in self._in_flight.items() if now - started >= interval]
+            for handle in slow:
+                try:
+                    self.publisher.extend_visibility(handle, self.visibility_timeout)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Failed to extend visibility of a shipping message")
+                else:
+                    with self._lock:
+                        if handle in self._in_flight:
+                            self._in_flight[handle] = now
+
+
+def _run_worker(concurrency: int, max_in_flight: int, visibility_timeout: int, max_receive_count: int,
+                metrics_port: int = 0) -> None:
+    if metrics_port:
+        serve_prometheus(metrics_port)
+    service = ShippingService(ShippingRepository(), ShippingPublisher())
+    # Клієнт SQS і ресурс DynamoDB створюються паралельно, поки налаштовується воркер
+    service.repository.warm_up(background=True)
+    service.publisher.warm_up(background=True)
+    worker = ShippingWorker(service, service.publisher, concurrency, max_in_flight, visibility_timeout,
+                            max_receive_count=max_receive_count)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop())
+    worker.run()
+    logger.info("Worker stopped: %d processed, %d failed, %d dead-lettered",
+                worker.processed, worker.failed, worker.dead_lettered)
+
+
+def main(argv: list[str] = None) -> None:
+    """Command line entry point for the shipping worker."""
+    parser = argparse.ArgumentParser(description="Process shippings from the shipping queue.")
+    parser.add_argument("--concurrency", type=int, default=SHIPPING_WORKER_CONCURRENCY)
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    parser.add_argument("--visibility-timeout", type=int, default=SHIPPING_WORKER_VISIBILITY_TIMEOUT)
+    parser.add_argument("--max-receive-count", type=int, default=SHIPPING_WORKER_MAX_RECEIVE_COUNT,
+                        help="move a message to the dead-letter queue after this many failed deliveries (0: never)")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--metrics-port", type=int, default=SHIPPING_METRICS_PORT,
+                        help="serve Prometheus metrics on this port; with --processes each process uses port + index")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+
+    worker_args = (args.concurrency, args.max_in_flight, args.visibility_timeout, args.max_receive_count)
+    if args.processes == 1:
+        _run_worker(*worker_args, args.metrics_port)
+        return
+    processes = [
+        multiprocessing.Process(
+            target=_run_worker,
+            args=(*worker_args, args.metrics_port and args.metrics_port + i),
+            name=f"shipping-worker-{i}",
+        )
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    # SIGINT з терміналу отримує вся група процесів, SIGTERM пересилаємо дочірнім процесам
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes])
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 import sys
 import os
+import uuid
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import pytest
 import boto3
-from services.db import get_dynamodb_resource
+from services.db import get_dynamodb_resource, create_shipping_table, create_outbox_table
 from botocore.exceptions import NoCredentialsError
 from services.config import AWS_ENDPOINT_URL, AWS_REGION
 
@@ -20,18 +21,23 @@ def setup_localstack_resources():
     )
     
     try:
-        existing_tables = dynamo_client.list_tables()["TableNames"]
-        if "ShippingTable" not in existing_tables:
-            dynamo_client.create_table(
-                TableName="ShippingTable",
-                KeySchema=[{"AttributeName": "shipping_id", "KeyType": "HASH"}],
-                AttributeDefinitions=[{"AttributeName": "shipping_id", "AttributeType": "S"}],
-                BillingMode="PAY_PER_REQUEST",
-            )
+        create_shipping_table(dynamo_client, "ShippingTable")
+        create_outbox_table(dynamo_client, "ShippingOutbox")
     except NoCredentialsError:
         raise Exception("No AWS credentials found!")
     
 @pytest.fixture
 def dynamo_resource():
     # Підключення до локальної бази даних DynamoDB
-    return get_dynamodb_resource()
\ No newline at end of file
+    return get_dynamodb_resource()
+
+
+@pytest.fixture
+def scratch_queue(monkeypatch):
+    # Окрема черга, щоб повідомлення тесту не лишалися в спільній ShippingQueue
+    client = boto3.client("sqs", endpoint_url=AWS_ENDPOINT_URL, region_name=AWS_REGION)
+    queue_name = f"ShippingQueue-{uuid.uuid4().hex}"
+    queue_url = client.create_queue(QueueName=queue_name)["QueueUrl"]
+    monkeypatch.setattr("services.publisher.SHIPPING_QUEUE", queue_name)
+    yield queue_url
+    client.delete_queue(QueueUrl=queue_url)
@@ -1,12 +1,40 @@
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+import threading
 import time
+from decimal import Decimal
 import uuid
 
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, EndpointConnectionError
 from app.eshop import Product, ShoppingCart, Order
+from app.inventory import InventoryStore
+from app.catalog import ColumnarCart, ColumnarCatalog
 import random
 from services import ShippingService
-from services.repository import ShippingRepository
-from services.publisher import ShippingPublisher
+from services.service import ShippingRequest, ShippingStateError
+from services.repository import DynamoDBShippingRepository, ShippingRepository, UnprocessedKeysError
+from services.memory_repository import InMemoryShippingRepository, MemoryStore
+from services.sqlite_repository import SQLiteShippingRepository
+from services.publisher import ShippingPublisher, BufferedShippingPublisher
+from services.worker import ShippingWorker
+from services.cache import CachedShippingRepository
+from services.outbox import OutboxRelay
+from services.metrics import InMemoryMetrics, instrument_client, set_metrics
+from services.poller import AdaptivePoller, ReceivedShipping
+from services.resilience import CircuitOpenError, Resilience, RetryBudget
+from services.scheduler import DueDateScheduler
+from services.db import create_shipping_table, wait_for_table_active
+from services import archive
+from services.archive import ShippingArchiver
+from benchmarks.fakes import FakeSQSClient
+from benchmarks.run import run_benchmarks
+from benchmarks.loadgen import read_replay, run_load, synthetic_orders
 from datetime import datetime, timedelta, timezone
 from services.config import AWS_ENDPOINT_URL, AWS_REGION, SHIPPING_QUEUE
 import pytest
@@ -298,4 +326,906 @@ def test_invalid_shipping_type_raises_error(dynamo_resource):
     with pytest.raises(ValueError) as excinfo:
         order.place_order("Invalid Shipping Type", due_date=datetime.now(timezone.utc) + timedelta(minutes=5))
 
-    assert "Shipping type is not available" in str(excinfo.value), "Expected error message for invalid shipping type"
\ No newline at end of file
+    assert "Shipping type is not available" in str(excinfo.value), "Expected error message for invalid shipping type"
+
+def test_buffered_publisher_sends_in_batches(mocker):
+    publisher = BufferedShippingPublisher(linger_seconds=60)
+    publisher.client = mocker.Mock()
+    publisher.client.get_queue_url.return_value = {"QueueUrl": "queue"}
+    publisher.client.send_message_batch.return_value = {"Successful": [], "Failed": []}
+
+    with publisher:
+        for i in range(12):
+            publisher.send_new_shipping(f"shipping_{i}")
+
+    calls = publisher.client.send_message_batch.call_args_list
+    sent = [entry["MessageBody"] for call in calls for entry in call.kwargs["Entries"]]
+    assert sorted(len(call.kwargs["Entries"]) for call in calls) == [2, 10]
+    assert sorted(sent) == sorted(f"shipping_{i}" for i in range(12))
+
+
+def test_buffered_publisher_retries_failed_entries(mocker):
+    publisher = BufferedShippingPublisher(linger_seconds=60)
+    publisher.client = mocker.Mock()
+    publisher.client.get_queue_url.return_value = {"QueueUrl": "queue"}
+    publisher.client.send_message_batch.side_effect = [
+        {"Successful": [{"Id": "0"}], "Failed": [{"Id": "1", "SenderFault": False}]},
+        {"Successful": [{"Id": "0"}], "Failed": []},
+    ]
+
+    publisher.send_new_shipping("shipping_1")
+    publisher.send_new_shipping("shipping_2")
+    assert publisher.close() == []
+
+    retried = publisher.client.send_message_batch.call_args_list[1].kwargs["Entries"]
+    assert [entry["MessageBody"] for entry in retried] == ["shipping_2"]
+
+
+def test_worker_deletes_only_processed_messages(mocker):
+    service = mocker.Mock()
+    publisher = mocker.Mock()
+    publisher.receive_shipping_messages.side_effect = [[
+        {"Body": "shipping_ok", "ReceiptHandle": "handle_ok"},
+        {"Body": "shipping_bad", "ReceiptHandle": "handle_bad"},
+    ]] + [[]] * 1000
+    publisher.delete_shippings.return_value = []
+
+    def process_shipping(shipping_id):
+        if shipping_id == "shipping_bad":
+            raise RuntimeError("Processing failed")
+        return {}
+
+    service.process_shipping.side_effect = process_shipping
+
+    worker = ShippingWorker(service, publisher, concurrency=2, wait_time_seconds=0)
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while worker.processed + worker.failed < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.stop()
+    thread.join(timeout=5)
+
+    assert (worker.processed, worker.failed) == (1, 1)
+    deleted = [handle for call in publisher.delete_shippings.call_args_list for handle in call.args[0]]
+    assert deleted == ["handle_ok"]
+
+
+def test_worker_dead_letters_messages_after_max_receive_count(mocker):
+    service = mocker.Mock()
+    service.process_shipping.side_effect = RuntimeError("Poison message")
+    client = mocker.Mock()
+    client.get_queue_url.side_effect = lambda QueueName: {"QueueUrl": QueueName}
+    publisher = ShippingPublisher(client=client)
+    worker = ShippingWorker(service, publisher, max_receive_count=3)
+
+    for receive_count in (2, 3):
+        handle = f"handle_{receive_count}"
+        worker._in_flight[handle] = time.monotonic()
+        worker._handle(ReceivedShipping("shipping_1", handle, receive_count))
+
+    assert (worker.failed, worker.dead_lettered) == (2, 1)
+    sent = client.send_message.call_args.kwargs
+    assert sent["QueueUrl"].endswith("-dlq") and sent["MessageBody"] == "shipping_1"
+    client.delete_message.assert_called_once_with(QueueUrl=SHIPPING_QUEUE, ReceiptHandle="handle_3")
+
+
+def test_async_shipping_service_round_trip(dynamo_resource, scratch_queue):
+    aio = pytest.importorskip("services.aio")
+    publisher = aio.AsyncShippingPublisher(scratch_queue.rsplit("/", 1)[-1])
+
+    async def scenario():
+        shipping_service = aio.AsyncShippingService(aio.AsyncShippingRepository(), publisher)
+        try:
+            shipping_ids = await asyncio.gather(*(
+                shipping_service.create_shipping(
+                    aio.AsyncShippingService.list_available_shipping_type()[0],
+                    ["Product"],
+                    str(uuid.uuid4()),
+                    datetime.now(timezone.utc) + timedelta(minutes=5)
+                )
+                for _ in range(5)
+            ))
+            polled = []
+            while len(polled) < len(shipping_ids):
+                polled.extend(await publisher.poll_shipping())
+            await asyncio.gather(*(shipping_service.process_shipping(shipping_id) for shipping_id in polled))
+            statuses = await asyncio.gather(*(shipping_service.check_status(shipping_id) for shipping_id in shipping_ids))
+            return shipping_ids, polled, statuses
+        finally:
+            await aio.close_async_clients()
+
+    shipping_ids, polled, statuses = asyncio.run(scenario())
+    assert sorted(polled) == sorted(shipping_ids), "Every created shipping should be polled from the queue"
+    assert statuses == [ShippingService.SHIPPING_COMPLETED] * 5, "All shippings should be 'completed'"
+
+
+def test_async_clients_are_cached_per_arguments():
+    aio = pytest.importorskip("services.aio")
+
+    async def scenario():
+        try:
+            first = await aio.get_async_client("sqs", aws_access_key_id="test", aws_secret_access_key="test")
+            second = await aio.get_async_client("sqs", aws_access_key_id="test", aws_secret_access_key="test")
+            other = await aio.get_async_client("sqs", aws_access_key_id="other", aws_secret_access_key="other")
+            return first is second, first is other
+        finally:
+            await aio.close_async_clients()
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_resilience_retries_throttled_async_calls(mocker):
+    throttled = ClientError({"Error": {"Code": "ThrottlingException"}}, "GetItem")
+    function = mocker.AsyncMock(side_effect=[throttled, {"Item": {}}])
+    resilience = Resilience(base_delay=0)
+
+    assert asyncio.run(resilience.call_async("dynamodb.get_item", function, Key="key")) == {"Item": {}}
+    assert function.await_count == 2
+    assert resilience.states() == {"dynamodb.get_item": "closed"}
+
+
+def test_publishers_share_client_and_queue_url(dynamo_resource):
+    first, second = ShippingPublisher(), ShippingPublisher()
+    assert first.client is second.client, "SQS client should be created once per process"
+    assert first.queue_url == second.queue_url
+    assert DynamoDBShippingRepository().table.meta.client is DynamoDBShippingRepository().table.meta.client
+
+def test_injected_client_does_not_poison_queue_url_cache(dynamo_resource):
+    assert ShippingPublisher(client=FakeSQSClient()).queue_url.startswith("fake://")
+    assert not ShippingPublisher().queue_url.startswith("fake://"), "Default publisher should use the real queue"
+
+
+def test_create_shipping_table_waits_for_each_new_index(mocker):
+    mocker.patch("services.db.time.sleep")
+    client = mocker.Mock()
+    client.list_tables.return_value = {"TableNames": ["ShippingTable"]}
+    creating = {"Table": {"TableStatus": "UPDATING", "GlobalSecondaryIndexes": [
+        {"IndexName": "shipping_status-due_at-index", "IndexStatus": "CREATING"}]}}
+    active = {"Table": {"TableStatus": "ACTIVE", "GlobalSecondaryIndexes": []}}
+    client.describe_table.side_effect = [active, active, creating, active, creating, creating, active]
+
+    create_shipping_table(client, "ShippingTable")
+
+    assert client.update_table.call_count == 2
+    assert client.describe_table.call_count == 7, "Every index create should wait for the previous one"
+
+
+def test_wait_for_table_active_times_out_with_index_status(mocker):
+    client = mocker.Mock()
+    client.describe_table.return_value = {"Table": {"TableStatus": "ACTIVE", "GlobalSecondaryIndexes": [
+        {"IndexName": "order_id-index", "IndexStatus": "CREATING"}]}}
+
+    with pytest.raises(TimeoutError) as excinfo:
+        wait_for_table_active(client, "ShippingTable", timeout=0, delay=0)
+    assert "order_id-index" in str(excinfo.value)
+
+
+def test_create_shippings_reports_errors_per_item(mocker):
+    mock_repo = mocker.Mock()
+    mock_publisher = mocker.Mock()
+    mock_publisher.MAX_BATCH_SIZE = 10
+    mock_repo.create_shippings_bulk.return_value = ["shipping_1", "shipping_2"]
+    mock_publisher.send_shippings_batch.return_value = ["shipping_2"]
+    shipping_service = ShippingService(mock_repo, mock_publisher)
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+    shipping_type = ShippingService.list_available_shipping_type()[0]
+
+    result = shipping_service.create_shippings([
+        ShippingRequest(shipping_type, ["Product"], "order_1", due_date),
+        ShippingRequest("Invalid Shipping", ["Product"], "order_2", due_date),
+        ShippingRequest(shipping_type, ["Product"], "order_3", due_date),
+    ])
+
+    assert result.shipping_ids == ["shipping_1", None, "shipping_2"]
+    assert sorted(result.errors) == [1, 2]
+    assert "Shipping type is not available" in str(result.errors[1])
+    mock_publisher.send_shippings_batch.assert_called_once_with(["shipping_1", "shipping_2"])
+
+
+def test_create_shippings_bulk_in_dynamodb(dynamo_resource):
+    shipping_service = ShippingService(ShippingRepository(), ShippingPublisher(client=FakeSQSClient()))
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+    requests = [
+        ShippingRequest(ShippingService.list_available_shipping_type()[i % 4], [f"Product_{i}"], f"order_{i}", due_date)
+        for i in range(30)
+    ]
+
+    result = shipping_service.create_shippings(requests)
+
+    assert result.errors == {}
+    assert len(shipping_service.publisher.client.messages) == 30
+    for request, shipping_id in zip(requests, result.shipping_ids):
+        shipping_data = shipping_service.repository.get_shipping(shipping_id)
+        assert shipping_data['order_id'] == request.order_id, "Shipping IDs should follow input order"
+
+
+def test_check_status_many(dynamo_resource):
+    shipping_service = ShippingService(ShippingRepository(), ShippingPublisher(client=FakeSQSClient()))
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+    result = shipping_service.create_shippings([
+        ShippingRequest(ShippingService.list_available_shipping_type()[0], ["Product"], f"order_{i}", due_date)
+        for i in range(120)
+    ])
+    shipping_service.process_shipping(result.shipping_ids[0])
+
+    statuses = shipping_service.check_status_many(result.shipping_ids + ["missing_shipping"])
+
+    assert len(statuses) == 120, "Statuses should be fetched across several batch_get_item chunks"
+    assert statuses[result.shipping_ids[0]] == ShippingService.SHIPPING_COMPLETED
+    assert statuses[result.shipping_ids[1]] == ShippingService.SHIPPING_CREATED
+    assert "missing_shipping" not in statuses
+
+
+def test_get_shippings_gives_up_on_unprocessed_keys(mocker):
+    mocker.patch("services.repository.time.sleep")
+    repository = DynamoDBShippingRepository(resilience=Resilience(max_attempts=3))
+    repository.table = mocker.Mock()
+    repository.table.name = "ShippingTable"
+    repository.dynamo_resource = mocker.Mock()
+
+    def batch_get_item(RequestItems):  # pylint: disable=invalid-name
+        keys = RequestItems["ShippingTable"]["Keys"]
+        # Щоразу повертається лише перший ключ, решта лишається необробленою
+        return {
+            "Responses": {"ShippingTable": [{"shipping_id": keys[0]["shipping_id"]}]},
+            "UnprocessedKeys": {"ShippingTable": {"Keys": keys[1:]}} if len(keys) > 1 else {},
+        }
+
+    repository.dynamo_resource.batch_get_item.side_effect = batch_get_item
+    with pytest.raises(UnprocessedKeysError) as error:
+        repository.get_shippings(["a", "b", "c", "d", "e"])
+
+    assert repository.dynamo_resource.batch_get_item.call_count == 3
+    assert sorted(error.value.shippings) == ["a", "b", "c"]
+    assert error.value.unprocessed_ids == ["d", "e"]
+
+
+def test_cached_repository_read_through_and_write_through(mocker):
+    now = [0.0]
+    mock_repo = mocker.Mock()
+    mock_repo.get_shipping.side_effect = lambda shipping_id: {
+        "shipping_id": shipping_id, "shipping_status": ShippingService.SHIPPING_CREATED
+    }
+    mock_repo.update_shipping_status.return_value = {"ResponseMetadata": {}}
+    repository = CachedShippingRepository(mock_repo, max_size=2, ttl_seconds=10, clock=lambda: now[0])
+    shipping_service = ShippingService(repository, mocker.Mock())
+
+    assert shipping_service.check_status("shipping_1") == ShippingService.SHIPPING_CREATED
+    shipping_service.complete_shipping("shipping_1")
+    assert shipping_service.check_status("shipping_1") == ShippingService.SHIPPING_COMPLETED
+    assert mock_repo.get_shipping.call_count == 1, "Second read should be served from the cache"
+
+    shipping_service.check_status("shipping_2")
+    shipping_service.check_status("shipping_3")
+    now[0] = 11
+    shipping_service.check_status("shipping_3")
+
+    assert (repository.stats.hits, repository.stats.misses) == (1, 4)
+    assert (repository.stats.evictions, repository.stats.expirations) == (1, 1)
+
+
+def test_process_shipping_refuses_terminal_shipping(dynamo_resource):
+    shipping_service = ShippingService(ShippingRepository(), ShippingPublisher(client=FakeSQSClient()))
+    shipping_type = ShippingService.list_available_shipping_type()[0]
+    on_time_id = shipping_service.create_shipping(
+        shipping_type, ["Product"], "order_1", datetime.now(timezone.utc) + timedelta(minutes=5)
+    )
+    overdue_id = shipping_service.create_shipping(
+        shipping_type, ["Product"], "order_2", datetime.now(timezone.utc) - timedelta(minutes=5)
+    )
+
+    shipping_service.process_shipping(on_time_id)
+    shipping_service.process_shipping(overdue_id)
+    with pytest.raises(ShippingStateError):
+        shipping_service.process_shipping(on_time_id)
+    with pytest.raises(ShippingStateError):
+        shipping_service.process_shipping("missing_shipping")
+
+    assert shipping_service.check_status(on_time_id) == shipping_service.SHIPPING_COMPLETED
+    assert shipping_service.check_status(overdue_id) == shipping_service.SHIPPING_FAILED
+
+
+def test_iter_shippings_by_status_due_date_and_order(dynamo_resource):
+    shipping_service = ShippingService(ShippingRepository(), ShippingPublisher(client=FakeSQSClient()))
+    order_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    result = shipping_service.create_shippings([
+        ShippingRequest(ShippingService.list_available_shipping_type()[0], ["Product"], order_id, now + timedelta(minutes=offset))
+        for offset in (-30, -20, -10, 10)
+    ])
+    shipping_service.process_shipping(result.shipping_ids[0])
+
+    overdue = [shipping['shipping_id'] for shipping in shipping_service.iter_overdue_shippings(now)]
+    by_order = [shipping['shipping_id'] for shipping in shipping_service.repository.iter_by_order(order_id, page_size=1)]
+
+    assert result.shipping_ids[0] not in overdue, "Processed shipping is no longer created"
+    assert overdue.index(result.shipping_ids[1]) < overdue.index(result.shipping_ids[2]), "Results follow due_date order"
+    assert result.shipping_ids[3] not in overdue
+    assert sorted(by_order) == sorted(result.shipping_ids)
+
+
+def test_benchmarks_run_against_fakes():
+    results = run_benchmarks("fake", iterations=5)
+    assert {result["name"] for result in results} >= {"order.place_order", "service.process_shipping"}
+    assert all(result["ops_per_sec"] > 0 and result["latency_us"]["p99"] >= result["latency_us"]["p50"] for result in results)
+
+
+def test_submit_cart_order_is_all_or_nothing():
+    inventory = InventoryStore()
+    plenty = Product("Plenty", 10.0, 10, inventory=inventory)
+    scarce = Product("Scarce", 10.0, 1, inventory=inventory)
+    standalone = Product("Standalone", 10.0, 10)
+    cart = ShoppingCart()
+    cart.add_product(plenty, 5)
+    cart.add_product(standalone, 5)
+    cart.add_product(scarce, 1)
+    scarce.buy(1)
+
+    with pytest.raises(ValueError):
+        cart.submit_cart_order()
+
+    assert (plenty.available_amount, scarce.available_amount, standalone.available_amount) == (10, 0, 10)
+    assert cart.contains_product(plenty), "Cart must stay intact after a failed order"
+
+
+def test_inventory_does_not_oversell_under_concurrency():
+    inventory = InventoryStore(stripes=4)
+    product = Product("Product", 10.0, 100, inventory=inventory)
+    sold = []
+
+    def checkout():
+        for _ in range(50):
+            cart = ShoppingCart()
+            try:
+                cart.add_product(product, 1)
+                cart.submit_cart_order()
+            except ValueError:
+                continue
+            sold.append(1)
+
+    threads = [threading.Thread(target=checkout) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(sold) == 100
+    assert product.available_amount == 0
+
+
+def test_columnar_cart_matches_shopping_cart_api():
+    catalog = ColumnarCatalog()
+    products = [catalog.add_product(f"Product {i}", 1.25 * (i + 1), 10) for i in range(4)]
+    cart = ColumnarCart(catalog)
+    for product in products:
+        cart.add_product(product, 2)
+    cart.add_product(products[3], 4)
+    cart.remove_product(products[0])
+
+    assert not cart.contains_product(products[0])
+    assert cart.calculate_total() == 32.5
+    assert cart.total_decimal == Decimal("32.50")
+    with pytest.raises(ValueError):
+        cart.add_product(products[1], 11)
+
+    assert sorted(cart.submit_cart_order()) == ["Product 1", "Product 2", "Product 3"]
+    assert [product.available_amount for product in products] == [10, 8, 8, 6]
+    assert len(cart) == 0
+
+
+def test_columnar_and_shopping_cart_totals_agree():
+    prices = [19.99, 0.1, 3, "7.05", 1234.5]
+    catalog = ColumnarCatalog()
+    columnar = ColumnarCart(catalog)
+    cart = ShoppingCart()
+    for i, price in enumerate(prices):
+        columnar.add_product(catalog.add_product(f"Product {i}", price, 10), 3)
+        cart.add_product(Product(f"Product {i}", price, 10), 3)
+
+    assert columnar.total_decimal == cart.total_decimal == Decimal("3793.92")
+    assert columnar.calculate_total() == cart.calculate_total() == 3793.92
+    with pytest.raises(ValueError):
+        catalog.add_product("Sub-cent", 19.999, 10)
+    assert "Sub-cent" not in catalog
+
+
+def test_cart_total_is_exact_and_incremental():
+    def ten_percent_off(product, amount, line_total):
+        return (line_total * Decimal("0.9")).quantize(Decimal("0.01"))
+
+    cart = ShoppingCart(line_adjuster=ten_percent_off)
+    first = Product("First", 0.1, 100)
+    second = Product("Second", 0.2, 100)
+    cart.add_product(first, 3)
+    cart.add_product(second, 1)
+    cart.add_product(first, 10)
+
+    assert cart.total_decimal == Decimal("0.90") + Decimal("0.18")
+    assert cart.calculate_total() == 1.08
+    cart.remove_product(first)
+    assert cart.total_decimal == Decimal("0.18")
+
+    # Запис напряму в products теж враховується
+    cart.products[second] = 2
+    cart.products[first] = 1
+    assert cart.total_decimal == Decimal("0.36") + Decimal("0.09")
+    del cart.products[first]
+    assert cart.total_decimal == Decimal("0.36")
+
+
+def test_outbox_mode_defers_publishing_to_relay(dynamo_resource, mocker):
+    mock_publisher = mocker.Mock()
+    mock_publisher.MAX_BATCH_SIZE = 10
+    mock_publisher.send_shippings_batch.return_value = []
+    repository = ShippingRepository()
+    shipping_service = ShippingService(repository, mock_publisher, use_outbox=True)
+
+    shipping_ids = [
+        shipping_service.create_shipping(
+            ShippingService.list_available_shipping_type()[0], ["Product"], "order_1",
+            datetime.now(timezone.utc) + timedelta(minutes=5)
+        )
+        for _ in range(12)
+    ]
+
+    mock_publisher.send_new_shipping.assert_not_called()
+    assert set(shipping_ids) <= set(repository.iter_outbox())
+    assert repository.get_shipping(shipping_ids[0])['shipping_status'] == ShippingService.SHIPPING_CREATED
+
+    relay = OutboxRelay(repository, mock_publisher)
+    assert relay.run_once() >= 12
+    sent = [shipping_id for call in mock_publisher.send_shippings_batch.call_args_list for shipping_id in call.args[0]]
+    assert set(shipping_ids) <= set(sent)
+    assert not set(shipping_ids) & set(repository.iter_outbox()), "Sent entries must leave the outbox"
+
+
+@pytest.mark.parametrize("backend", ["dynamodb", "memory", "sqlite"])
+def test_bulk_creation_in_outbox_mode_writes_markers(backend, dynamo_resource, tmp_path, mocker):
+    repository = {
+        "dynamodb": DynamoDBShippingRepository,
+        "memory": lambda: InMemoryShippingRepository(MemoryStore()),
+        "sqlite": lambda: SQLiteShippingRepository(str(tmp_path / "shipping.db")),
+    }[backend]()
+    mock_publisher = mocker.Mock()
+    shipping_service = ShippingService(repository, mock_publisher, use_outbox=True)
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+
+    result = shipping_service.create_shippings([
+        ShippingRequest(ShippingService.list_available_shipping_type()[0], ["Product"], "order_1", due_date)
+        for _ in range(60)
+    ])
+
+    assert result.errors == {}
+    mock_publisher.send_shippings_batch.assert_not_called()
+    assert set(result.shipping_ids) <= set(repository.iter_outbox()), "Every shipping gets an outbox marker"
+    assert len(repository.get_shippings(result.shipping_ids)) == 60
+    repository.delete_outbox_entries(result.shipping_ids)
+
+
+def test_orders_get_unique_ids():
+    shipping_service = ShippingService(None, None)
+    assert Order(ShoppingCart(), shipping_service).order_id != Order(ShoppingCart(), shipping_service).order_id
+
+
+def test_retried_order_with_idempotency_key_returns_same_shipping(dynamo_resource, mocker):
+    publisher = mocker.Mock()
+    order_id = str(uuid.uuid4())
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+    shipping_type = ShippingService.list_available_shipping_type()[0]
+    first_process = ShippingService(ShippingRepository(), publisher)
+    second_process = ShippingService(ShippingRepository(), publisher)
+
+    shipping_id = first_process.create_shipping(shipping_type, ["Product"], order_id, due_date, idempotency_key="checkout-1")
+    cached_id = first_process.create_shipping(shipping_type, ["Product"], order_id, due_date, idempotency_key="checkout-1")
+    replayed_id = second_process.create_shipping(shipping_type, ["Product"], order_id, due_date, idempotency_key="checkout-1")
+    other_id = second_process.create_shipping(shipping_type, ["Product"], order_id, due_date, idempotency_key="checkout-2")
+
+    assert shipping_id == cached_id == replayed_id
+    assert other_id != shipping_id
+    assert publisher.send_new_shipping.call_count == 3, "Cached replays must not reach the network"
+    assert len(list(first_process.repository.iter_by_order(order_id))) == 2
+
+
+def test_retried_checkout_takes_stock_once(mocker):
+    repository = InMemoryShippingRepository(MemoryStore())
+    publisher = mocker.Mock()
+    product = Product('Product', 10.0, 10)
+    cart = ShoppingCart()
+    cart.add_product(product, 3)
+    order = Order(cart, ShippingService(repository, publisher))
+    shipping_type = ShippingService.list_available_shipping_type()[0]
+
+    shipping_id = order.place_order(shipping_type, idempotency_key="k")
+    cart.add_product(product, 3)
+    assert order.place_order(shipping_type, idempotency_key="k") == shipping_id
+    assert product.available_amount == 7
+
+    # Повтор в іншому процесі знаходить замовлення в репозиторії
+    other_process = Order(ShoppingCart(), ShippingService(repository, publisher), order.order_id)
+    other_process.cart.add_product(product, 3)
+    assert other_process.place_order(shipping_type, idempotency_key="k") == shipping_id
+    assert product.available_amount == 7
+    assert publisher.send_new_shipping.call_count == 2, "A replay from the repository is sent again"
+
+
+def test_concurrent_checkouts_with_same_key_take_stock_once(dynamo_resource, mocker):
+    product = Product('Product', 10.0, 10)
+    order_id = str(uuid.uuid4())
+    shipping_type = ShippingService.list_available_shipping_type()[0]
+    barrier = threading.Barrier(2)
+    results = []
+
+    def checkout():
+        cart = ShoppingCart()
+        cart.add_product(product, 3)
+        order = Order(cart, ShippingService(DynamoDBShippingRepository(), mocker.Mock()), order_id)
+        barrier.wait()
+        results.append(order.place_order(shipping_type, idempotency_key="k"))
+
+    threads = [threading.Thread(target=checkout) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 2 and results[0] == results[1], "Both checkouts should return the same shipping"
+    assert product.available_amount == 7, "Stock should be taken only once"
+
+
+def test_metrics_record_aws_calls_and_service_methods(dynamo_resource, scratch_queue):
+    metrics = InMemoryMetrics()
+    set_metrics(metrics)
+    try:
+        shipping_service = ShippingService(DynamoDBShippingRepository(), ShippingPublisher())
+        shipping_id = shipping_service.create_shipping(
+            ShippingService.list_available_shipping_type()[0], ["Product"], str(uuid.uuid4()),
+            datetime.now(timezone.utc) + timedelta(minutes=5)
+        )
+        shipping_service.check_status(shipping_id)
+        shipping_service.publisher.receive_shipping_messages(batch_size=1, wait_time_seconds=0)
+    finally:
+        set_metrics(None)
+
+    assert metrics.counter("aws_calls_total", service="dynamodb", operation="put_item") == 1
+    assert metrics.counter("aws_calls_total", service="dynamodb", operation="get_item") == 1
+    assert metrics.histogram_count("aws_call_seconds", service="sqs", operation="send_message") == 1
+    assert metrics.histogram_count("sqs_receive_batch_size") == 1
+    assert metrics.histogram_count("shipping_service_seconds", method="create_shipping") == 1
+    assert 'aws_call_seconds_bucket{operation="get_item",service="dynamodb",le="+Inf"} 1' in metrics.render_prometheus()
+
+
+@pytest.mark.parametrize("sink", [None, InMemoryMetrics()])
+def test_instrumented_client_surfaces_connection_errors(sink):
+    client = instrument_client(boto3.client(
+        "dynamodb", endpoint_url="http://127.0.0.1:1", region_name=AWS_REGION,
+        aws_access_key_id="test", aws_secret_access_key="test",
+        config=Config(retries={"max_attempts": 1}, connect_timeout=1),
+    ))
+    resilience = Resilience(max_attempts=3, base_delay=0, failure_threshold=3, reset_seconds=60, sleep=lambda _: None)
+    set_metrics(sink)
+    try:
+        with pytest.raises(EndpointConnectionError):
+            resilience.call("dynamodb.get_item", client.get_item, TableName="ShippingTable",
+                            Key={"shipping_id": {"S": "x"}})
+    finally:
+        set_metrics(None)
+
+    assert resilience.states() == {"dynamodb.get_item": "open"}, "Connection errors are retried and trip the breaker"
+    if sink is not None:
+        assert sink.counter("aws_call_errors_total", service="dynamodb", operation="get_item",
+                            code="EndpointConnectionError") == 3
+
+
+def test_adaptive_poller_follows_queue_depth(mocker):
+    publisher = mocker.Mock()
+
+    def receive(batch_size, **kwargs):
+        return [
+            {"Body": f"shipping_{i}", "ReceiptHandle": f"handle_{i}", "Attributes": {"ApproximateReceiveCount": "2"}}
+            for i in range(batch_size)
+        ]
+
+    publisher.receive_shipping_messages.side_effect = receive
+    with AdaptivePoller(publisher, max_wait_time_seconds=20, max_parallel_receives=4) as poller:
+        assert poller.poll(capacity=3)[0] == ReceivedShipping("shipping_0", "handle_0", 2)
+        for _ in range(10):
+            poller.poll(capacity=40)
+        assert poller.wait_time_seconds == 0
+        publisher.receive_shipping_messages.reset_mock()
+        assert len(poller.poll(capacity=40)) == 40
+        assert publisher.receive_shipping_messages.call_count == 4
+
+        publisher.receive_shipping_messages.side_effect = lambda **kwargs: []
+        for _ in range(6):
+            poller.poll(capacity=40)
+        assert poller.wait_time_seconds == 20
+        assert poller.parallel_receives(40) == 1
+
+
+class FlakyProxy:
+    """Stand-in that fails the first ``failures`` calls of every method with the given error code."""
+
+    def __init__(self, target, failures, code="ProvisionedThroughputExceededException"):
+        self.target = target
+        self.failures = failures
+        self.code = code
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self.target, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            self.calls += 1
+            if self.calls <= self.failures:
+                raise ClientError({"Error": {"Code": self.code, "Message": "injected"}}, name)
+            return attribute(*args, **kwargs)
+        return call
+
+
+def test_repository_and_publisher_retry_throttled_calls(dynamo_resource, scratch_queue):
+    resilience = Resilience(max_attempts=4, sleep=lambda seconds: None)
+    repository = DynamoDBShippingRepository(resilience=resilience)
+    publisher = ShippingPublisher(resilience=resilience)
+    repository.table = FlakyProxy(repository.table, failures=2)
+    publisher.client = FlakyProxy(publisher.client, failures=3, code="ThrottlingException")
+
+    shipping_id = repository.create_shipping("Самовивіз", ["Product"], str(uuid.uuid4()), "created",
+                                             datetime.now(timezone.utc) + timedelta(minutes=5))
+    assert repository.get_shipping(shipping_id)["shipping_status"] == "created"
+    assert publisher.send_new_shipping(shipping_id)
+    # Клієнт SQS: три тротлінги, get_queue_url нової черги і send_message
+    assert (repository.table.calls, publisher.client.calls) == (4, 5)
+    assert resilience.states() == {
+        "sqs.get_queue_url": "closed", "dynamodb.put_item": "closed",
+        "dynamodb.get_item": "closed", "sqs.send_message": "closed",
+    }
+
+    repository.table = FlakyProxy(repository.table.target, failures=1, code="ConditionalCheckFailedException")
+    with pytest.raises(ClientError):
+        repository.get_shipping(shipping_id)
+    assert repository.table.calls == 1, "Errors a retry cannot fix must not be retried"
+
+
+def test_circuit_breaker_fails_fast_and_recovers(mocker):
+    now = [0.0]
+    resilience = Resilience(max_attempts=1, failure_threshold=2, reset_seconds=30,
+                            clock=lambda: now[0], sleep=lambda seconds: None)
+    table = FlakyProxy(mocker.Mock(), failures=2)
+
+    for _ in range(2):
+        with pytest.raises(ClientError):
+            resilience.call("dynamodb.get_item", table.get_item)
+    assert resilience.states() == {"dynamodb.get_item": "open"}
+    with pytest.raises(CircuitOpenError):
+        resilience.call("dynamodb.get_item", table.get_item)
+    assert table.calls == 2
+
+    now[0] = 31
+    assert resilience.states() == {"dynamodb.get_item": "half_open"}
+    resilience.call("dynamodb.get_item", table.get_item)
+    assert resilience.states() == {"dynamodb.get_item": "closed"}
+
+
+def test_retry_budget_limits_retries(mocker):
+    resilience = Resilience(max_attempts=10, budget=RetryBudget(capacity=3, refill_per_second=0),
+                            sleep=lambda seconds: None)
+    table = FlakyProxy(mocker.Mock(), failures=100)
+    with pytest.raises(ClientError):
+        resilience.call("dynamodb.get_item", table.get_item)
+    assert table.calls == 4
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_local_backends_behave_like_dynamodb(backend, tmp_path):
+    if backend == "memory":
+        repository = InMemoryShippingRepository(MemoryStore())
+    else:
+        repository = SQLiteShippingRepository(str(tmp_path / "shipping.db"))
+    now = datetime.now(timezone.utc)
+    order_id = str(uuid.uuid4())
+    due_dates = [now - timedelta(minutes=5), now + timedelta(minutes=5), now - timedelta(minutes=10)]
+    shipping_ids = repository.create_shippings_bulk(
+        [("Самовивіз", ["Product"], order_id, due_date) for due_date in due_dates], "created"
+    )
+    outboxed = repository.create_shipping("Самовивіз", ["Product"], order_id, "created", now, outbox=True)
+
+    assert [item["shipping_id"] for item in repository.iter_shippings("created", due_before=now, page_size=1)] == [
+        shipping_ids[2], shipping_ids[0]
+    ]
+    assert len(list(repository.iter_by_order(order_id, page_size=2))) == 4
+    assert repository.get_shippings(shipping_ids[:1] + ["missing"], attributes=["shipping_status"]) == {
+        shipping_ids[0]: {"shipping_id": shipping_ids[0], "shipping_status": "created"}
+    }
+    assert list(repository.iter_outbox()) == [outboxed]
+    repository.delete_outbox_entries([outboxed])
+    assert not list(repository.iter_outbox())
+
+    service = ShippingService(repository, None)
+    service.process_shipping(shipping_ids[0])
+    service.process_shipping(shipping_ids[1])
+    assert service.check_status_many(shipping_ids[:2]) == {
+        shipping_ids[0]: ShippingService.SHIPPING_FAILED, shipping_ids[1]: ShippingService.SHIPPING_COMPLETED
+    }
+    with pytest.raises(ShippingStateError):
+        service.process_shipping(shipping_ids[0])
+
+    first = repository.create_shipping_once("Самовивіз", ["Product"], order_id, "created", now, "key")
+    replay = repository.create_shipping_once("Самовивіз", ["Product"], order_id, "created", now, "key")
+    assert (first[1], replay) == (True, (first[0], False))
+
+
+def test_incomplete_backend_fails_at_construction():
+    class PartialRepository(ShippingRepository):  # pylint: disable=abstract-method
+        def get_shipping(self, shipping_id, attributes=None):
+            return None
+
+    with pytest.raises(TypeError, match="abstract"):
+        PartialRepository()
+    assert isinstance(ShippingRepository(), ShippingRepository), "Dispatch to the configured backend still works"
+
+
+def test_scheduler_fires_shippings_when_due(tmp_path):
+    now = [time.time()]
+    service = ShippingService(InMemoryShippingRepository(MemoryStore()), None)
+    shipping_type = ShippingService.list_available_shipping_type()[0]
+    start = datetime.fromtimestamp(now[0], timezone.utc)
+    overdue, soon, later = service.repository.create_shippings_bulk([
+        (shipping_type, ["Product"], "order", start - timedelta(seconds=30)),
+        (shipping_type, ["Product"], "order", start + timedelta(seconds=10)),
+        (shipping_type, ["Product"], "order", start + timedelta(hours=1)),
+    ], ShippingService.SHIPPING_CREATED)
+    checkpoint = str(tmp_path / "scheduler.json")
+    scheduler = DueDateScheduler(service, lead_seconds=1, horizon_seconds=60, checkpoint_path=checkpoint,
+                                 clock=lambda: now[0])
+
+    assert scheduler.refresh() == 2, "Shippings beyond the horizon are loaded later"
+    assert scheduler.run_due() == 1
+    assert service.check_status(overdue) == ShippingService.SHIPPING_FAILED
+    assert scheduler.next_deadline() == pytest.approx(now[0] + 9)
+
+    restarted = DueDateScheduler(service, lead_seconds=1, checkpoint_path=checkpoint, clock=lambda: now[0])
+    assert restarted.load_checkpoint() == 1
+    now[0] += 9
+    assert restarted.run_due() == 1
+    assert service.check_status(soon) == ShippingService.SHIPPING_COMPLETED
+    assert service.check_status(later) == ShippingService.SHIPPING_CREATED
+    restarted.stop()
+
+
+def test_publisher_delays_near_term_shippings(mocker):
+    client = mocker.Mock()
+    client.get_queue_url.return_value = {"QueueUrl": "queue"}
+    client.send_message.return_value = {"MessageId": "1"}
+    publisher = ShippingPublisher(client=client)
+    service = ShippingService(mocker.Mock(), publisher, delay_until_due=True)
+    service.repository.create_shipping.return_value = "shipping_1"
+
+    service.create_shipping(ShippingService.list_available_shipping_type()[0], ["Product"], "order",
+                            datetime.now(timezone.utc) + timedelta(seconds=61))
+    service.create_shipping(ShippingService.list_available_shipping_type()[0], ["Product"], "order",
+                            datetime.now(timezone.utc) + timedelta(days=1))
+
+    delays = [call.kwargs.get("DelaySeconds") for call in client.send_message.call_args_list]
+    assert delays == [59, ShippingPublisher.MAX_DELAY_SECONDS]
+
+
+def test_cart_code_and_service_construction_do_not_load_botocore():
+    code = (
+        "import sys\n"
+        "from app.eshop import Product, ShoppingCart\n"
+        "ShoppingCart().add_product(Product('Product', 10.0, 5), 2)\n"
+        "assert 'botocore' not in sys.modules, 'cart code loaded botocore'\n"
+        "from services.service import ShippingService\n"
+        "from services.repository import ShippingRepository\n"
+        "from services.publisher import ShippingPublisher\n"
+        "ShippingService(ShippingRepository(), ShippingPublisher())\n"
+        "assert 'botocore' not in sys.modules, 'constructing the service created AWS clients'\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+
+
+def test_shipping_items_are_compact_and_old_items_still_work(dynamo_resource):
+    repository = DynamoDBShippingRepository()
+    service = ShippingService(repository, None)
+    now = datetime.now(timezone.utc)
+    order_id = str(uuid.uuid4())
+    shipping_id = repository.create_shipping("Самовивіз", ["A", "B"], order_id, "created", now + timedelta(minutes=5))
+
+    stored = repository.table.get_item(Key={"shipping_id": shipping_id})["Item"]
+    assert stored["v"] == 2 and stored["product_ids"] == ["A", "B"] and isinstance(stored["due_at"], Decimal)
+    shipping = repository.get_shipping(shipping_id)
+    assert shipping["product_ids"] == ["A", "B"]
+    assert abs(shipping["due_date"] - (now + timedelta(minutes=5))) < timedelta(milliseconds=1)
+    assert repository.get_shipping(shipping_id, attributes=["shipping_status"]) == {
+        "shipping_id": shipping_id, "shipping_status": "created"
+    }
+
+    # Елемент у форматі до версії 2
+    old_id = str(uuid.uuid4())
+    repository.table.put_item(Item={
+        "shipping_id": old_id, "shipping_type": "Самовивіз", "order_id": order_id, "product_ids": "A,B",
+        "shipping_status": "created", "created_date": now.isoformat(),
+        "due_date": (now - timedelta(minutes=5)).isoformat(),
+    })
+    assert repository.get_shipping(old_id)["product_ids"] == ["A", "B"]
+    assert old_id not in [item["shipping_id"] for item in repository.iter_shippings("created", due_before=now)]
+
+    assert repository.upgrade_items() >= 1
+    upgraded = repository.table.get_item(Key={"shipping_id": old_id})["Item"]
+    assert upgraded["v"] == 2 and "due_date" not in upgraded and upgraded["product_ids"] == ["A", "B"]
+    assert old_id in [item["shipping_id"] for item in repository.iter_shippings("created", due_before=now)]
+
+    legacy_id = str(uuid.uuid4())
+    repository.table.put_item(Item={
+        "shipping_id": legacy_id, "shipping_status": "created", "due_date": (now + timedelta(minutes=5)).isoformat()
+    })
+    service.process_shipping(old_id)
+    service.process_shipping(legacy_id)
+    assert service.check_status_many([old_id, legacy_id]) == {
+        old_id: ShippingService.SHIPPING_FAILED, legacy_id: ShippingService.SHIPPING_COMPLETED
+    }
+
+
+def test_load_generator_reports_throughput_latency_and_errors(tmp_path):
+    replay = tmp_path / "orders.jsonl"
+    replay.write_text(
+        '{"at": 0, "shipping_type": "Самовивіз", "products": [["A", 1.5, 2]]}\n'
+        '{"shipping_type": "Телепортація", "products": [["B", 2, 1]]}\n',
+        encoding="utf-8",
+    )
+    orders = read_replay(str(replay), rate=10) + synthetic_orders(18, rate=100, seed=1)
+    orders.sort(key=lambda order: order["at"])
+
+    report = run_load("fake", orders, processes=2, interval=0.1)
+
+    assert report["total"]["orders"] == 20
+    assert report["total"]["errors"] == {"ValueError": 1}, "Unknown shipping type is reported, not raised"
+    assert report["total"]["latency_ms"]["p50"] <= report["total"]["latency_ms"]["p99"]
+    assert sum(bucket["orders"] for bucket in report["timeline"]) == 20
+
+
+def test_archiver_moves_terminal_shippings_to_files_and_resumes(dynamo_resource, tmp_path, mocker):
+    repository = DynamoDBShippingRepository()
+    service = ShippingService(repository, None)
+    now = datetime.now(timezone.utc)
+    order_id = str(uuid.uuid4())
+    terminal_ids = repository.create_shippings_bulk(
+        [("Самовивіз", ["Product"], order_id, now + timedelta(minutes=5))] * 5, ShippingService.SHIPPING_CREATED
+    )
+    for shipping_id in terminal_ids:
+        service.process_shipping(shipping_id)
+    pending_id = repository.create_shipping("Самовивіз", ["Product"], order_id, "created", now)
+    checkpoint = str(tmp_path / "archive.json")
+
+    write_file = archive.write_file
+
+    def fail_after_first_file(*args):
+        if list(tmp_path.glob("files/**/*.jsonl.gz")):
+            raise OSError("disk full")
+        return write_file(*args)
+
+    mocker.patch("services.archive.write_file", side_effect=fail_after_first_file)
+    interrupted = ShippingArchiver(repository, str(tmp_path / "files"), segments=1, chunk_size=2, page_size=2,
+                                   checkpoint_path=checkpoint, file_format="jsonl")
+    with pytest.raises(OSError):
+        interrupted.run()
+    assert interrupted.archived > 0 and os.path.exists(checkpoint)
+
+    mocker.stopall()
+    resumed = ShippingArchiver(repository, str(tmp_path / "files"), segments=2, chunk_size=2, page_size=2,
+                               checkpoint_path=checkpoint, file_format="jsonl")
+    resumed.run()
+    assert resumed.segments == 1, "Segment count is taken from the checkpoint"
+    assert not os.path.exists(checkpoint)
+
+    archived = {}
+    for path in tmp_path.glob("files/**/*.jsonl.gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            archived.update((item["shipping_id"], item) for item in map(json.loads, file))
+    assert set(terminal_ids) <= set(archived)
+    assert archived[terminal_ids[0]]["product_ids"] == ["Product"]
+    assert pending_id not in archived
+    assert repository.get_shippings(terminal_ids + [pending_id]).keys() == {pending_id}